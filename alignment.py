@@ -0,0 +1,75 @@
+import re
+
+from rapidfuzz.distance import Levenshtein
+
+# Reproduces jiwer 3.0.3's default transforms and alignments. jiwer maps
+# every token to a character and runs rapidfuzz's bit-parallel Levenshtein
+# kernel on the result; the kernel only depends on which tokens are equal,
+# so calling it on the strings (characters) and on integer word ids (words)
+# yields the same alignments without jiwer's per-chunk objects and the
+# second full pass of jiwer.wer.
+
+MULTIPLE_SPACES_RE = re.compile(r"\s\s+")
+
+EMPTY_REFERENCE_ERROR = "one or more references are empty strings"
+REFERENCE_TRANSFORM_ERROR = (
+    "After applying the transformation, each reference should be a "
+    "non-empty list of strings, with each string being a single word."
+)
+
+
+def character_errors(reference, hypothesis):
+    """
+    Character-level alignment of jiwer.process_characters (leading and
+    trailing whitespace stripped, spaces count as characters).
+
+    Returns (cer, error_arrays), where error_arrays holds the same
+    insertion, deletion and substitution lists as get_error_arrays. Like
+    jiwer's chunks, the indexes refer to the stripped texts and are applied
+    to the texts as given.
+    """
+    if not reference:
+        raise ValueError(EMPTY_REFERENCE_ERROR)
+    stripped_reference = reference.strip()
+    if not stripped_reference:
+        raise ValueError(REFERENCE_TRANSFORM_ERROR)
+
+    editops = Levenshtein.editops(stripped_reference, hypothesis.strip())
+
+    insertion = []
+    deletion = []
+    substitution = []
+    for tag, ref_start, ref_end, hyp_start, hyp_end in editops.as_opcodes().as_list():
+        if tag == 'insert':
+            insertion.extend(hypothesis[hyp_start:hyp_end])
+        elif tag == 'delete':
+            deletion.extend(reference[ref_start:ref_end])
+        elif tag == 'replace':
+            substitution.append({
+                "removed": hypothesis[hyp_start:hyp_end],
+                "replaced": reference[ref_start:ref_end]
+            })
+
+    error_arrays = {
+        'insertion': insertion,
+        'deletion': deletion,
+        'substitution': substitution,
+    }
+    return len(editops) / len(stripped_reference), error_arrays
+
+
+def split_words(text):
+    # jiwer's wer_default: collapse whitespace runs, strip, split on spaces
+    return [word for word in MULTIPLE_SPACES_RE.sub(" ", text).strip().split(" ") if word]
+
+
+def word_error_rate(reference, hypothesis):
+    """Same value as jiwer.wer(reference, hypothesis)."""
+    if not reference:
+        raise ValueError(EMPTY_REFERENCE_ERROR)
+    word_ids = {}
+    reference_ids = [word_ids.setdefault(word, len(word_ids)) for word in split_words(reference)]
+    if not reference_ids:
+        raise ValueError(REFERENCE_TRANSFORM_ERROR)
+    hypothesis_ids = [word_ids.setdefault(word, len(word_ids)) for word in split_words(hypothesis)]
+    return Levenshtein.distance(reference_ids, hypothesis_ids) / len(reference_ids)
@@ -1,6 +1,13 @@
+import logging
 import os
 from fastapi import FastAPI
 from routes import router
+from executors import shutdown_executors, start_executors
+from ffmpeg_supervisor import ffmpeg_supervisor
+from learner_profiles import learner_profiles
+from warmup import memory_usage, warm_up
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     docs_url='/api/docs',
@@ -9,7 +16,34 @@ app = FastAPI(
 
 app.include_router(router)
 
+@app.on_event("startup")
+def startup_event():
+    # A no-op when the master process already warmed up before forking
+    try:
+        warm_up()
+    except Exception:
+        # /health/ready keeps reporting the error instead of the worker dying
+        pass
+    start_executors()
+    ffmpeg_supervisor.start()
+    learner_profiles.start()
+    logger.info(f"Worker {os.getpid()} started, rss {memory_usage()['rss_bytes']} bytes")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    ffmpeg_supervisor.stop()
+    learner_profiles.stop()
+    shutdown_executors()
+
 if __name__ == "__main__":
     import uvicorn
-    num_workers = os.cpu_count() or 1
-    uvicorn.run("app:app", host="0.0.0.0", port=5001, debug=False, workers=num_workers)
\ No newline at end of file
+    from metrics import clear_metrics_dir
+    clear_metrics_dir()
+    num_workers = int(os.getenv("WORKERS", "0")) or os.cpu_count() or 1
+    # Workers read it to split the host-wide ffmpeg limits between them
+    os.environ["WORKERS"] = str(num_workers)
+    if os.getenv("STARTUP_MODE", "preload") == "preload":
+        import prefork
+        prefork.serve(app, host="0.0.0.0", port=5001, workers=num_workers)
+    else:
+        uvicorn.run("app:app", host="0.0.0.0", port=5001, debug=False, workers=num_workers)
\ No newline at end of file
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import tempfile
+import time
+
+from metrics import observe_stage, record_audio_cache
+from result_cache import cache_key
+from sqlite_store import SQLiteConnections, trim_lru
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_ENABLED = os.getenv("AUDIO_CACHE_ENABLED", "true").lower() == "true"
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "./cache/audio")
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Part of every key, so entries written by an older denoise graph are not
+# served once the graph changes
+AUDIO_CACHE_VERSION = 2
+
+AUDIO_CACHE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS audio_cache ("
+    "key TEXT PRIMARY KEY, size INTEGER NOT NULL, pauses TEXT, "
+    "created_at REAL NOT NULL, accessed_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS audio_cache_accessed_at ON audio_cache (accessed_at)",
+)
+
+
+def audio_cache_key(audio_data, content_type, padding_duration=0.1, time_stretch_factor=0.75, output_format='wav'):
+    """Content hash of the audio bytes and every setting that changes the denoised output."""
+    digest = hashlib.sha256(audio_data).hexdigest()
+    return cache_key("denoise", AUDIO_CACHE_VERSION, digest, content_type, padding_duration, time_stretch_factor, output_format)
+
+
+def map_file(path):
+    """
+    Read-only memory map of a cached file. The mapping stays valid after the
+    file is evicted and unlinked by any worker, so hits can be served from it
+    without holding a lock.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+
+def iter_mapped(audio, chunk_size=64 * 1024):
+    # Response body chunks straight from a mapped cache file
+    try:
+        for offset in range(0, len(audio), chunk_size):
+            yield audio[offset:offset + chunk_size]
+    finally:
+        audio.close()
+
+
+class AudioCache:
+    """
+    Denoised audio on local disk, one file per entry, with an SQLite index
+    holding each entry's size, pauses and last access time. Files are
+    written to a temporary name and renamed into place, and the index is
+    trimmed to max_bytes least recently used first in one transaction, so
+    all workers on the host can share the directory.
+    """
+
+    def __init__(self, enabled=AUDIO_CACHE_ENABLED, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.enabled = enabled
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._connections = SQLiteConnections(os.path.join(directory, "index.sqlite3"), AUDIO_CACHE_SCHEMA)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Returns (audio, pauses) for a cached entry, or None. audio is a
+        read-only memory map of the file; pauses is None if they were not
+        detected when the entry was stored.
+        """
+        if not self.enabled:
+            return None
+        with observe_stage("audio_cache_lookup"):
+            try:
+                entry = self._get(key)
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Error reading the audio cache: {str(e)}")
+                entry = None
+        record_audio_cache(entry is not None)
+        return entry
+
+    def _get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT pauses FROM audio_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            audio = map_file(self.path(key))
+        except FileNotFoundError:
+            # Evicted by another worker between the lookup and the open
+            conn.execute("DELETE FROM audio_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE audio_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return audio, json.loads(row[0]) if row[0] is not None else None
+
+    def set(self, key, audio, pauses=None):
+        """Stores the denoised audio and, if detected, its pauses. Errors are logged, not raised."""
+        if not self.enabled or len(audio) > self.max_bytes:
+            return
+        try:
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(audio)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            now = time.time()
+            self._connection().execute(
+                "INSERT OR REPLACE INTO audio_cache (key, size, pauses, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, len(audio), json.dumps(pauses) if pauses is not None else None, now, now),
+            )
+            self.trim()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error writing the audio cache: {str(e)}")
+
+    def set_pauses(self, key, pauses):
+        # For entries stored by a request that had pause counting disabled
+        if not self.enabled:
+            return
+        try:
+            self._connection().execute("UPDATE audio_cache SET pauses = ? WHERE key = ?", (json.dumps(pauses), key))
+        except sqlite3.Error as e:
+            logger.error(f"Error writing the audio cache: {str(e)}")
+
+    def trim(self):
+        keys = trim_lru(self._connection(), "audio_cache", self.max_bytes)
+        # Readers that already mapped one of these files keep their mapping
+        for key in keys:
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+        return len(keys)
+
+
+audio_cache = AudioCache()
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from collections import deque
+from contextlib import AsyncExitStack
+
+from ffmpeg_supervisor import FFmpegTimeoutError, ffmpeg_supervisor
+from metrics import observe_stage, record_ffmpeg_job
+from utils import (
+    AUDIO_OUTPUT_FORMATS, AUDIO_SIGNATURE_BYTES, audio_input_format,
+    denoise_and_detect_command, denoise_command, parse_silence_line, pause_detection_command,
+)
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_BYTES = 64 * 1024
+# Upper bound on a streamed upload, and on the whole streamed ffmpeg run
+MAX_AUDIO_STREAM_BYTES = int(os.getenv("MAX_AUDIO_STREAM_BYTES", str(1024 * 1024 * 1024)))
+FFMPEG_STREAM_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_STREAM_TIMEOUT_SECONDS", "3600"))
+
+
+class StreamTooLargeError(ValueError):
+    pass
+
+
+class OutputSpool:
+    """
+    Append-only temporary file between ffmpeg's stdout and the response.
+
+    ffmpeg output is written here as soon as it is produced and the response
+    follows it from its own offset. Memory stays at one chunk whether or not
+    the client reads the response while it is still uploading.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(prefix="audio-stream-")
+        self._fd = self._file.fileno()
+        self.size = 0
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def write(self, data):
+        os.pwrite(self._fd, data, self.size)
+        self.size += len(data)
+        self._changed.set()
+
+    def finish(self):
+        self.closed = True
+        self._changed.set()
+
+    async def ready(self):
+        while not self.size and not self.closed:
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def chunks(self):
+        offset = 0
+        while True:
+            if offset < self.size:
+                data = os.pread(self._fd, min(STREAM_CHUNK_BYTES, self.size - offset), offset)
+                offset += len(data)
+                yield data
+                continue
+            if self.closed:
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    def close(self):
+        self._file.close()
+
+
+class AudioStreamJob:
+    """
+    Pipes an audio upload through one ffmpeg process as it arrives.
+
+    The container is recognized from the first bytes of the body, the body is
+    fed to ffmpeg's stdin chunk by chunk, silencedetect lines are parsed from
+    stderr as ffmpeg logs them, and the denoised audio is spooled for the
+    response. Nothing proportional to the clip length is held in
+    memory apart from the list of pauses.
+    """
+
+    def __init__(self, body, content_type, enable_pause_count, enable_denoiser, output_format='wav',
+                 max_bytes=MAX_AUDIO_STREAM_BYTES, timeout=FFMPEG_STREAM_TIMEOUT_SECONDS):
+        self.content_type = content_type
+        self.output_format = output_format
+        self.media_type = AUDIO_OUTPUT_FORMATS[output_format]['media_type']
+        self.args = None
+        self.body = body.__aiter__()
+        self.header = b""
+        self.enable_pause_count = enable_pause_count
+        self.enable_denoiser = enable_denoiser
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.pauses = []
+        self.received_bytes = 0
+        self.spool = OutputSpool()
+        self._stderr_tail = deque(maxlen=20)
+        self._exit_stack = AsyncExitStack()
+        self._task = None
+
+    def command(self, input_format):
+        if self.enable_denoiser and self.enable_pause_count:
+            return denoise_and_detect_command(self.content_type, input_format=input_format, output_format=self.output_format)
+        if self.enable_denoiser:
+            return denoise_command(self.content_type, input_format=input_format, output_format=self.output_format)
+        return pause_detection_command(input_format)
+
+    async def _read_header(self):
+        # Enough of the body to recognize the container; it is fed to ffmpeg
+        # ahead of the rest
+        while len(self.header) < AUDIO_SIGNATURE_BYTES:
+            try:
+                chunk = await self.body.__anext__()
+            except StopAsyncIteration:
+                break
+            self.header += chunk
+            self.received_bytes += len(chunk)
+
+    async def start(self):
+        # UnsupportedAudioFormatError is raised here before an ffmpeg slot is
+        # taken; an empty body leaves received_bytes at 0
+        await self._read_header()
+        input_format = audio_input_format(self.header)
+        # Without -nostats the progress line is rewritten with \r and never
+        # ends, so stderr could not be read line by line
+        self.args = self.command(input_format).global_args('-nostats').compile()
+        # Waits for an ffmpeg slot; FFmpegBusyError is raised from here
+        process = await self._exit_stack.enter_async_context(ffmpeg_supervisor.process(self.args))
+        self._task = asyncio.ensure_future(self._run(process))
+
+    async def _feed(self, process):
+        try:
+            process.stdin.write(self.header)
+            self.header = b""
+            async for chunk in self.body:
+                self.received_bytes += len(chunk)
+                if self.received_bytes > self.max_bytes:
+                    raise StreamTooLargeError(f"Audio exceeds the maximum stream size of {self.max_bytes} bytes.")
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg stopped reading (bad input); its exit status says why
+            pass
+
+    async def _read_output(self, process):
+        while True:
+            data = await process.stdout.read(STREAM_CHUNK_BYTES)
+            if not data:
+                return
+            self.spool.write(data)
+
+    async def _read_log(self, process):
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                return
+            line = line.decode(errors='replace')
+            self._stderr_tail.append(line)
+            parse_silence_line(line, self.pauses)
+
+    async def _run(self, process):
+        try:
+            with observe_stage("ffmpeg_run"):
+                await asyncio.wait_for(
+                    asyncio.gather(self._feed(process), self._read_output(process), self._read_log(process), process.wait()),
+                    self.timeout,
+                )
+        except asyncio.TimeoutError:
+            record_ffmpeg_job("timeout")
+            raise FFmpegTimeoutError(f"ffmpeg did not finish within {self.timeout:g}s")
+        except BaseException:
+            record_ffmpeg_job("error")
+            raise
+        finally:
+            # Frees the ffmpeg slot (killing ffmpeg on failure) before the
+            # client has necessarily finished downloading the output
+            await self._exit_stack.aclose()
+            self.spool.finish()
+
+        if process.returncode != 0:
+            record_ffmpeg_job("error")
+            raise RuntimeError(f"Error during audio processing with FFmpeg: {''.join(self._stderr_tail)}")
+        record_ffmpeg_job("ok")
+
+    async def output_started(self):
+        """Waits until ffmpeg has produced output or has finished."""
+        await self.spool.ready()
+
+    def done(self):
+        return self._task is not None and self._task.done()
+
+    async def result(self):
+        """Waits for ffmpeg to finish and returns the pause summary."""
+        await self._task
+        if not self.enable_pause_count:
+            return {"pause_count": 0, "pauses": None}
+        return {"pause_count": len(self.pauses), "pauses": self.pauses}
+
+    async def multipart(self, boundary):
+        """
+        Yields a multipart/mixed body: the denoised WAV as it is produced,
+        then a JSON part with the pause summary, or with an error if
+        processing failed after the response had started.
+        """
+        try:
+            yield f"--{boundary}\r\nContent-Type: {self.media_type}\r\n\r\n".encode()
+            async for chunk in self.spool.chunks():
+                yield chunk
+            try:
+                summary = await self.result()
+            except Exception as e:
+                logger.error(f"Error in streamed audio processing: {str(e)}")
+                summary = {"pause_count": 0, "pauses": None, "error": str(e)}
+            yield f"\r\n--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode()
+            yield json.dumps(summary).encode()
+            yield f"\r\n--{boundary}--\r\n".encode()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+        self.spool.close()
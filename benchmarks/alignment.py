@@ -0,0 +1,123 @@
+"""
+Checks the alignment engine (alignment.character_errors and
+alignment.word_error_rate) against the jiwer pipeline it replaces on
+randomized inputs, then times both on the benchmark corpora.
+
+    python benchmarks/alignment.py [--cases 20000] [--repeat 5]
+
+Exits non-zero if any case differs, including the error raised for
+invalid references.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jiwer
+
+from alignment import character_errors, word_error_rate
+from corpus import CONTENT_TYPES, LANGUAGES, VOCABULARY, text_pairs
+from utils import get_error_arrays
+
+# Few distinct symbols so random texts share a lot, plus the whitespace
+# variants the transforms treat differently
+SYMBOLS = list("abcde") + [" ", " ", "  ", "\t", "\n", " ", "é", "अ", "ा", "்"]
+
+
+def jiwer_errors(reference, hypothesis):
+    char_output = jiwer.process_characters(reference, hypothesis)
+    wer = jiwer.wer(reference, hypothesis)
+    return wer, char_output.cer, get_error_arrays(char_output.alignments, reference, hypothesis)
+
+
+def engine_errors(reference, hypothesis):
+    cer, error_arrays = character_errors(reference, hypothesis)
+    return word_error_rate(reference, hypothesis), cer, error_arrays
+
+
+def outcome(func, reference, hypothesis):
+    try:
+        return func(reference, hypothesis)
+    except Exception as e:
+        return ("error", type(e).__name__, str(e))
+
+
+def random_case(rng):
+    kind = rng.random()
+    if kind < 0.4:
+        # Random symbol soup, including empty and whitespace-only texts
+        reference = "".join(rng.choice(SYMBOLS) for _ in range(rng.randint(0, 40)))
+        hypothesis = "".join(rng.choice(SYMBOLS) for _ in range(rng.randint(0, 40)))
+    else:
+        # Word-level edits of a real sentence
+        words = VOCABULARY[rng.choice(LANGUAGES)]
+        reference_words = [rng.choice(words) for _ in range(rng.randint(1, 80))]
+        hypothesis_words = []
+        for word in reference_words:
+            roll = rng.random()
+            if roll < 0.1:
+                continue
+            if roll < 0.2:
+                hypothesis_words.append(rng.choice(words))
+            elif roll < 0.3:
+                hypothesis_words.append(word[:-1] or word)
+            else:
+                hypothesis_words.append(word)
+            if rng.random() < 0.05:
+                hypothesis_words.append(rng.choice(words))
+        separator = rng.choice([" ", " ", "  "])
+        reference = separator.join(reference_words)
+        hypothesis = " ".join(hypothesis_words)
+        if rng.random() < 0.2:
+            hypothesis = " " + hypothesis + "  "
+    return reference, hypothesis
+
+
+def best_time(func, pairs, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for reference, hypothesis in pairs:
+            func(reference, hypothesis)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = []
+    for _ in range(args.cases):
+        reference, hypothesis = random_case(rng)
+        expected = outcome(jiwer_errors, reference, hypothesis)
+        actual = outcome(engine_errors, reference, hypothesis)
+        if expected != actual:
+            mismatches.append({"reference": reference, "hypothesis": hypothesis, "jiwer": expected, "engine": actual})
+
+    timings = []
+    for content_type in CONTENT_TYPES:
+        pairs = [pair for language in LANGUAGES for pair in text_pairs(language, content_type, count=20, seed=args.seed)]
+        jiwer_seconds = best_time(jiwer_errors, pairs, args.repeat)
+        engine_seconds = best_time(engine_errors, pairs, args.repeat)
+        timings.append({
+            "content_type": content_type,
+            "jiwer_us": jiwer_seconds * 1e6,
+            "engine_us": engine_seconds * 1e6,
+            "speedup": jiwer_seconds / engine_seconds,
+        })
+
+    print(json.dumps({"cases": args.cases, "mismatches": len(mismatches), "examples": mismatches[:5], "timings": timings}, indent=2, ensure_ascii=False))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares the word-by-word fuzzywuzzy loop in find_closest_match with the
+single similarity-matrix call used by identify_missing_tokens.
+
+    python benchmarks/closest_match.py [--repeat 5]
+
+Exits non-zero if the two give different matches; tests/test_closest_match.py
+covers the same on smaller inputs.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import find_closest_match, find_closest_matches
+
+VOCABULARY = "the a cat dog frog jumps runs over big small red sat on mat it is sun fun reading book apple quick brown fox lazy river garden teacher".split()
+
+
+def make_passage(length, rng):
+    return [rng.choice(VOCABULARY) for _ in range(length)]
+
+
+def best_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    mismatches = 0
+    for size in args.sizes:
+        reference = make_passage(size, rng)
+        hypothesis = make_passage(size, rng)
+        hypothesis_text = ' '.join(hypothesis)
+
+        loop_matches = [find_closest_match(word, hypothesis_text) for word in reference]
+        matrix_matches = find_closest_matches(reference, hypothesis)
+        mismatches += sum(a != b for a, b in zip(loop_matches, matrix_matches))
+
+        loop = best_time(lambda: [find_closest_match(word, hypothesis_text) for word in reference], args.repeat)
+        matrix = best_time(lambda: find_closest_matches(reference, hypothesis), args.repeat)
+        results.append({
+            "words": size,
+            "loop_seconds": loop,
+            "matrix_seconds": matrix,
+            "speedup": loop / matrix if matrix else None,
+        })
+
+    print(json.dumps({"mismatches": mismatches, "timings": results}, indent=2))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
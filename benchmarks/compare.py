@@ -0,0 +1,53 @@
+"""
+Compares two benchmark reports written by micro.py or load.py.
+
+    python benchmarks/compare.py baseline.json candidate.json [--metric p50] [--threshold 10]
+
+Exits with status 1 if any benchmark got slower by more than --threshold
+percent on the chosen metric.
+"""
+import argparse
+import json
+import sys
+
+
+def result_key(result):
+    params = ','.join(f"{k}={v}" for k, v in sorted(result.get("params", {}).items()))
+    return f"{result['name']}[{params}]"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", default="p50", choices=["mean", "min", "p50", "p95", "p99"])
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown in percent.")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = {result_key(r): r for r in json.load(f)["results"]}
+
+    regressions = []
+    print(f"{'benchmark':60} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before = baseline[key][args.metric]
+        after = candidate[key][args.metric]
+        change = (after - before) / before * 100 if before else 0.0
+        marker = ""
+        if change > args.threshold:
+            regressions.append(key)
+            marker = "  REGRESSION"
+        print(f"{key:60} {before * 1000:10.3f}ms {after * 1000:10.3f}ms {change:+8.1f}%{marker}")
+
+    for key in sorted(baseline.keys() - candidate.keys()):
+        print(f"{key:60} missing from candidate")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than {args.threshold}% on {args.metric}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
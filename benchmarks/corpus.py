@@ -0,0 +1,81 @@
+"""
+Deterministic synthetic inputs shared by the benchmarks: reference and
+hypothesis texts per language and content type, and WAV clips with
+speech-like tone bursts separated by pauses.
+"""
+import io
+import random
+
+import numpy as np
+import soundfile as sf
+
+LANGUAGES = ["en", "hi", "ta", "te", "kn"]
+
+VOCABULARY = {
+    "en": "the a cat dog frog jumps runs over big small red sat on mat it is sun fun reading book apple quick brown fox lazy river garden teacher school water tree friend".split(),
+    "hi": "नमस्ते भारत पानी किताब घर बच्चा स्कूल खेल दोस्त सूरज चाँद पेड़ नदी फूल माँ".split(),
+    "ta": "வணக்கம் தமிழ் பள்ளி புத்தகம் வீடு நீர் மரம் சூரியன் நிலா நண்பன் பூ ஆறு அம்மா".split(),
+    "te": "నమస్కారం తెలుగు బడి పుస్తకం ఇల్లు నీరు చెట్టు సూర్యుడు చంద్రుడు స్నేహితుడు పువ్వు నది అమ్మ".split(),
+    "kn": "ನಮಸ್ಕಾರ ಕನ್ನಡ ಶಾಲೆ ಪುಸ್ತಕ ಮನೆ ನೀರು ಮರ ಸೂರ್ಯ ಚಂದ್ರ ಸ್ನೇಹಿತ ಹೂವು ನದಿ ಅಮ್ಮ".split(),
+}
+
+# Words per text and seconds of audio for each contentType
+CONTENT_TYPES = {
+    "Word": {"words": 1, "seconds": 1.0},
+    "Sentence": {"words": 8, "seconds": 5.0},
+    "Paragraph": {"words": 60, "seconds": 30.0},
+}
+
+SAMPLE_RATE = 16000
+
+
+def make_reference(language, words, rng):
+    return ' '.join(rng.choice(VOCABULARY[language]) for _ in range(words))
+
+
+def make_hypothesis(reference, language, rng, error_rate=0.2):
+    # Learner-style reading: dropped, substituted and inserted words plus
+    # character slips inside otherwise correct words
+    hypothesis = []
+    for word in reference.split():
+        roll = rng.random()
+        if roll < error_rate / 3:
+            continue
+        if roll < 2 * error_rate / 3:
+            hypothesis.append(rng.choice(VOCABULARY[language]))
+        elif roll < error_rate:
+            hypothesis.extend([word, rng.choice(VOCABULARY[language])])
+        elif roll < error_rate * 1.5 and len(word) > 2:
+            i = rng.randrange(len(word))
+            hypothesis.append(word[:i] + word[i + 1:])
+        else:
+            hypothesis.append(word)
+    return ' '.join(hypothesis)
+
+
+def text_pairs(language, content_type, count, seed=0):
+    rng = random.Random(f"{seed}-{language}-{content_type}")
+    words = CONTENT_TYPES[content_type]["words"]
+    pairs = []
+    for _ in range(count):
+        reference = make_reference(language, words, rng)
+        pairs.append((reference, make_hypothesis(reference, language, rng)))
+    return pairs
+
+
+def make_wav(seconds, seed=0, sample_rate=SAMPLE_RATE):
+    """Alternating tone bursts and pauses (some of them over 0.5s) with a low noise floor."""
+    rng = np.random.RandomState(seed)
+    total = int(seconds * sample_rate)
+    samples = np.zeros(total, dtype=np.float32)
+    position = 0
+    while position < total:
+        burst = int(rng.uniform(0.2, 0.8) * sample_rate)
+        t = np.arange(min(burst, total - position)) / sample_rate
+        samples[position:position + len(t)] = 0.3 * np.sin(2 * np.pi * rng.uniform(150, 400) * t)
+        position += burst + int(rng.uniform(0.1, 0.9) * sample_rate)
+    samples += rng.randn(total).astype(np.float32) * 0.001
+
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
@@ -0,0 +1,99 @@
+"""
+Checks utils.LiveTextMatrices (the /live_evaluation session state) against
+compute_text_matrices on every partial of simulated streaming ASR sessions,
+then times a whole session both ways: incremental updates versus scoring
+each partial from scratch.
+
+    python benchmarks/live_evaluation.py [--sessions 20] [--repeat 3]
+
+Exits non-zero if any partial differs.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import CONTENT_TYPES, LANGUAGES, VOCABULARY, text_pairs
+from utils import LiveTextMatrices, compute_text_matrices
+
+
+def partials(hypothesis, language, rng):
+    # ASR-style partials: each word shows up half-recognized first, and now
+    # and then the last word is revised before the next one arrives
+    words = hypothesis.split()
+    shown = []
+    result = []
+    for word in words:
+        if len(word) > 2 and rng.random() < 0.5:
+            result.append(' '.join(shown + [word[:len(word) // 2]]))
+        if rng.random() < 0.1:
+            result.append(' '.join(shown + [rng.choice(VOCABULARY[language])]))
+        shown.append(word)
+        result.append(' '.join(shown))
+    return result or [""]
+
+
+def sessions(content_type, count, seed):
+    rng = random.Random(f"{seed}-live-{content_type}")
+    return [
+        (reference, language, partials(hypothesis, language, rng))
+        for language in LANGUAGES
+        for reference, hypothesis in text_pairs(language, content_type, count=count, seed=seed)
+    ]
+
+
+def full(reference, language, stream):
+    return [compute_text_matrices(reference, hypothesis, language) for hypothesis in stream]
+
+
+def live(reference, language, stream):
+    session = LiveTextMatrices(reference, language)
+    return [session.update(hypothesis) for hypothesis in stream]
+
+
+def best_time(func, items, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(*item)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions per language and content type")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mismatches = []
+    timings = []
+    for content_type in CONTENT_TYPES:
+        items = sessions(content_type, args.sessions, args.seed)
+        for reference, language, stream in items:
+            for hypothesis, expected, actual in zip(stream, full(reference, language, stream), live(reference, language, stream)):
+                if expected != actual:
+                    mismatches.append({"reference": reference, "hypothesis": hypothesis, "full": expected, "live": actual})
+
+        full_seconds = best_time(full, items, args.repeat)
+        live_seconds = best_time(live, items, args.repeat)
+        timings.append({
+            "content_type": content_type,
+            "partials_per_session": sum(len(stream) for _, _, stream in items) / len(items),
+            "full_ms": full_seconds * 1e3,
+            "live_ms": live_seconds * 1e3,
+            "speedup": full_seconds / live_seconds,
+        })
+
+    print(json.dumps({"mismatches": len(mismatches), "examples": mismatches[:5], "timings": timings}, indent=2, ensure_ascii=False))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+In-process load harness: drives the FastAPI app through an ASGI transport
+with a fixed number of concurrent clients and reports throughput and latency
+percentiles per endpoint as JSON.
+
+    python benchmarks/load.py --concurrency 16 --requests 400 \
+        --endpoints getTextMatrices getPhonemes audio_processing --output load.json
+
+The inputs repeat, so the result and denoised audio caches are turned off
+to measure the processing path. --cached measures with both caches on
+instead, the audio cache in a temporary directory.
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from corpus import CONTENT_TYPES, LANGUAGES, make_wav, text_pairs
+from stats import run_metadata, summarize
+
+ENDPOINTS = ["getTextMatrices", "getPhonemes", "audio_processing"]
+
+
+def build_requests(endpoint, content_types, seed):
+    """Returns a list of (path, json body) for one endpoint."""
+    rng = random.Random(seed)
+    requests = []
+    if endpoint == "getTextMatrices":
+        for language in LANGUAGES:
+            for content_type in content_types:
+                for reference, hypothesis in text_pairs(language, content_type, count=10, seed=seed):
+                    requests.append(("/getTextMatrices", {"reference": reference, "hypothesis": hypothesis, "language": language}))
+    elif endpoint == "getPhonemes":
+        for content_type in content_types:
+            for reference, _ in text_pairs("en", content_type, count=20, seed=seed):
+                requests.append(("/getPhonemes", {"text": reference}))
+    elif endpoint == "audio_processing":
+        for content_type in content_types:
+            for clip_seed in range(3):
+                audio = base64.b64encode(make_wav(CONTENT_TYPES[content_type]["seconds"], seed=clip_seed)).decode('utf-8')
+                requests.append(("/audio_processing", {
+                    "base64_string": audio,
+                    "enablePauseCount": True,
+                    "enableDenoiser": True,
+                    "contentType": content_type,
+                }))
+    rng.shuffle(requests)
+    return requests
+
+
+async def run_load(app, endpoint_requests, total_requests, concurrency, timeout):
+    # Round-robin across endpoints so every endpoint sees the same share of load
+    cycles = {name: itertools.cycle(reqs) for name, reqs in endpoint_requests.items() if reqs}
+    schedule = [
+        (name, next(cycles[name]))
+        for name in itertools.islice(itertools.cycle(list(cycles)), total_requests)
+    ]
+
+    queue = asyncio.Queue()
+    for item in schedule:
+        queue.put_nowait(item)
+
+    latencies = {name: [] for name in endpoint_requests}
+    errors = {name: 0 for name in endpoint_requests}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+        async def worker():
+            while True:
+                try:
+                    endpoint, (path, body) = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json=body)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies[endpoint].append(time.perf_counter() - start)
+                if not ok:
+                    errors[endpoint] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    results = []
+    for endpoint, timings in latencies.items():
+        if not timings:
+            continue
+        results.append({
+            "name": endpoint,
+            "params": {"concurrency": concurrency},
+            "errors": errors[endpoint],
+            **summarize(timings),
+        })
+    return {
+        "elapsed_seconds": elapsed,
+        "throughput_rps": total_requests / elapsed if elapsed else None,
+        "results": results,
+    }
+
+
+async def main_async(args):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    audio_cache_dir = None
+    if args.cached:
+        audio_cache_dir = tempfile.mkdtemp(prefix="load-audio-cache-")
+        os.environ.update({"RESULT_CACHE_ENABLED": "true", "AUDIO_CACHE_ENABLED": "true", "AUDIO_CACHE_DIR": audio_cache_dir})
+    else:
+        os.environ.update({"RESULT_CACHE_ENABLED": "false", "AUDIO_CACHE_ENABLED": "false"})
+
+    # Imported here so pool sizes, backends and caches can be set through the environment first
+    from app import app
+
+    endpoint_requests = {
+        endpoint: build_requests(endpoint, args.content_types, args.seed)
+        for endpoint in args.endpoints
+    }
+
+    await app.router.startup()
+    try:
+        if args.warmup:
+            await run_load(app, endpoint_requests, args.warmup, args.concurrency, args.timeout)
+        report = await run_load(app, endpoint_requests, args.requests, args.concurrency, args.timeout)
+    finally:
+        await app.router.shutdown()
+        if audio_cache_dir:
+            shutil.rmtree(audio_cache_dir, ignore_errors=True)
+
+    return {"meta": {**run_metadata(), "args": vars(args)}, **report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--content-types", nargs="+", choices=list(CONTENT_TYPES), default=list(CONTENT_TYPES))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20, help="Requests sent before measuring.")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cached", action="store_true", help="Keep the result and denoised audio caches on, so repeated inputs are served from them.")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
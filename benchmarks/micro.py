@@ -0,0 +1,107 @@
+"""
+Micro-benchmarks for the hot functions behind the three endpoints.
+
+    python benchmarks/micro.py [--iterations 50] [--output micro.json]
+
+Every result is keyed by benchmark name plus its parameters so two runs can
+be compared with benchmarks/compare.py.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jiwer
+
+from alignment import character_errors
+from corpus import CONTENT_TYPES, LANGUAGES, make_wav, text_pairs
+from lexicon import lexicon
+from stats import run_metadata, summarize
+from utils import detect_pauses, get_error_arrays, phoneme_ids, processLP, split_into_phonemes
+
+
+def time_calls(func, inputs, iterations, setup=None):
+    timings = []
+    for i in range(iterations):
+        if setup is not None:
+            setup()
+        args = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def bench_text(iterations):
+    results = []
+    for language in LANGUAGES:
+        for content_type in CONTENT_TYPES:
+            pairs = text_pairs(language, content_type, count=20)
+            alignments = [
+                (jiwer.process_characters(reference, hypothesis).alignments, reference, hypothesis)
+                for reference, hypothesis in pairs
+            ]
+            results.append({
+                "name": "get_error_arrays",
+                "params": {"language": language, "contentType": content_type},
+                **time_calls(get_error_arrays, alignments, iterations),
+            })
+            results.append({
+                "name": "character_errors",
+                "params": {"language": language, "contentType": content_type},
+                **time_calls(character_errors, pairs, iterations),
+            })
+            if language == "en":
+                results.append({
+                    "name": "processLP",
+                    "params": {"language": language, "contentType": content_type},
+                    **time_calls(processLP, pairs, iterations),
+                })
+                ipa = [(lexicon.convert(reference),) for reference, _ in pairs]
+                results.append({
+                    "name": "split_into_phonemes_cold",
+                    "params": {"language": language, "contentType": content_type},
+                    **time_calls(split_into_phonemes, ipa, iterations, setup=phoneme_ids.cache_clear),
+                })
+    return results
+
+
+def bench_audio(iterations):
+    results = []
+    for content_type, spec in CONTENT_TYPES.items():
+        clips = [(make_wav(spec["seconds"], seed=seed),) for seed in range(3)]
+        for backend in ("numpy", "ffmpeg"):
+            results.append({
+                "name": "get_pause_count",
+                "params": {"backend": backend, "contentType": content_type},
+                **time_calls(lambda audio: detect_pauses(audio, backend), clips, iterations),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--audio-iterations", type=int, default=10)
+    parser.add_argument("--skip-audio", action="store_true", help="Skip the pause detection benchmarks (they need ffmpeg).")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    lexicon.load()
+    results = bench_text(args.iterations)
+    if not args.skip_audio:
+        results.extend(bench_audio(args.audio_iterations))
+
+    report = json.dumps({"meta": run_metadata(), "results": results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Times the compiled phoneme tokenizer (utils.phoneme_ids) against the
+slicing split_into_phonemes it replaced, on CMU dictionary transcriptions,
+along with the phoneme set step of identify_missing_tokens (string sets vs
+phoneme id bitmasks). tests/test_phonemes.py checks that both give the
+same results.
+
+    python benchmarks/phonemes.py [--words 20000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import CONTENT_TYPES, text_pairs
+from lexicon import lexicon
+from tests.test_phonemes import legacy_split_into_phonemes
+from utils import mask_to_phonemes, phoneme_ids, phoneme_mask
+
+
+@lru_cache(maxsize=None)
+def legacy_split_cached(token):
+    return legacy_split_into_phonemes(token, Counter())
+
+
+def legacy_phoneme_sets_cached(construct_ipa, missing_ipa):
+    # The legacy set step with warm split_into_phonemes caches
+    construct_phonemes = [legacy_split_cached(ipa) for ipa in construct_ipa]
+    missing_phonemes = [legacy_split_cached(ipa) for ipa in missing_ipa]
+    missing = set(phoneme for sublist in missing_phonemes for phoneme in sublist)
+    construct = set(phoneme for sublist in construct_phonemes for phoneme in sublist)
+    return list(construct), list(missing)
+
+
+def mask_phoneme_sets(construct_ipa, missing_ipa):
+    construct_mask = 0
+    missing_mask = 0
+    for ipa in construct_ipa:
+        construct_mask |= phoneme_mask(ipa)
+    for ipa in missing_ipa:
+        missing_mask |= phoneme_mask(ipa)
+    return mask_to_phonemes(construct_mask), mask_to_phonemes(missing_mask)
+
+
+def best_time(func, args_list, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / len(args_list)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, default=20000, help="CMU dictionary words to transcribe")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lexicon.load()
+    words = sorted(lexicon._entries)
+    dictionary_ipa = [lexicon.convert(word) for word in rng.sample(words, min(args.words, len(words)))]
+
+    scratch = Counter()
+    timings = [{
+        "name": "tokenize_cold",
+        "legacy_us": best_time(legacy_split_into_phonemes, [(t, scratch) for t in dictionary_ipa], args.repeat) * 1e6,
+        "tokenizer_us": best_time(phoneme_ids, [(t,) for t in dictionary_ipa], args.repeat, setup=phoneme_ids.cache_clear) * 1e6,
+    }]
+
+    # Phoneme sets of identify_missing_tokens over the benchmark corpus: half
+    # the words of each text treated as constructed, half as missing
+    for content_type in CONTENT_TYPES:
+        cases = []
+        for reference, hypothesis in text_pairs("en", content_type, count=20, seed=args.seed):
+            ipa = lexicon.convert_many(reference.lower().split())
+            construct_ipa = lexicon.convert_many(hypothesis.lower().split())
+            cases.append((construct_ipa, ipa[::2]))
+        legacy_seconds = best_time(legacy_phoneme_sets_cached, cases, args.repeat)
+        mask_seconds = best_time(mask_phoneme_sets, cases, args.repeat)
+        timings.append({
+            "name": "phoneme_sets_warm",
+            "content_type": content_type,
+            "legacy_us": legacy_seconds * 1e6,
+            "tokenizer_us": mask_seconds * 1e6,
+        })
+    for timing in timings:
+        timing["speedup"] = timing["legacy_us"] / timing["tokenizer_us"]
+
+    print(json.dumps({"words": len(dictionary_ipa), "timings": timings}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
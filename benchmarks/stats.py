@@ -0,0 +1,31 @@
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def summarize(timings):
+    timings = np.asarray(timings, dtype=np.float64)
+    return {
+        "count": int(timings.size),
+        "mean": float(timings.mean()),
+        "min": float(timings.min()),
+        "p50": float(np.percentile(timings, 50)),
+        "p95": float(np.percentile(timings, 95)),
+        "p99": float(np.percentile(timings, 99)),
+    }
+
+
+def run_metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
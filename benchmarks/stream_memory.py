@@ -0,0 +1,187 @@
+"""
+Memory check for /audio_processing/stream: starts the API in a uvicorn
+subprocess, uploads generated clips of increasing length without ever
+holding them in memory, and reports the peak RSS of the server and of its
+ffmpeg child for each length as JSON. Peaks should stay flat from a one
+minute clip to a one hour one.
+
+    python benchmarks/stream_memory.py --minutes 1 10 60 --output stream_memory.json
+"""
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+
+from corpus import SAMPLE_RATE
+from stats import run_metadata
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOCK_SECONDS = 10
+# Enough of the response to hold the pause summary of an hour-long clip
+SUMMARY_TAIL_BYTES = 1024 * 1024
+
+
+def wav_header(num_samples, sample_rate=SAMPLE_RATE):
+    data_size = num_samples * 2
+    return (
+        b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+def generate_wav(seconds, seed=0, sample_rate=SAMPLE_RATE):
+    """Yields a 16-bit mono WAV of tone bursts and pauses block by block."""
+    rng = np.random.RandomState(seed)
+    total = int(seconds * sample_rate)
+    yield wav_header(total, sample_rate)
+    block = BLOCK_SECONDS * sample_rate
+    for start in range(0, total, block):
+        n = min(block, total - start)
+        t = np.arange(n) / sample_rate
+        # 2.5s of tone then 1.5s of near silence, repeated
+        tone = ((start + np.arange(n)) % (4 * sample_rate)) < int(2.5 * sample_rate)
+        samples = np.where(tone, 0.3 * np.sin(2 * np.pi * 220 * t), 0.0) + rng.randn(n) * 0.001
+        yield (samples * 32767).astype('<i2').tobytes()
+
+
+def rss_bytes(pid, field="VmRSS"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def ffmpeg_pids(pid):
+    # The server's other children are the text process pool workers
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+    pids = []
+    for child in children:
+        try:
+            with open(f"/proc/{child}/comm") as f:
+                if f.read().strip() == "ffmpeg":
+                    pids.append(child)
+        except OSError:
+            pass
+    return pids
+
+
+class MemorySampler(threading.Thread):
+    """Polls the RSS of the server and the summed RSS of its ffmpeg children."""
+
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.server_peak = 0
+        self.ffmpeg_peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.server_peak = max(self.server_peak, rss_bytes(self.pid))
+            self.ffmpeg_peak = max(self.ffmpeg_peak, sum(rss_bytes(child) for child in ffmpeg_pids(self.pid)))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def start_server(port):
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT, "WORKERS": "1"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health/ready").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    server.kill()
+    raise RuntimeError("Server did not become ready")
+
+
+def stream_clip(port, seconds, content_type, denoise):
+    url = f"http://127.0.0.1:{port}/audio_processing/stream"
+    params = {"contentType": content_type, "enablePauseCount": "true", "enableDenoiser": str(denoise).lower()}
+    received = 0
+    tail = b""
+    with httpx.stream("POST", url, params=params, content=generate_wav(seconds),
+                      headers={"content-type": "audio/wav"}, timeout=None) as response:
+        for chunk in response.iter_bytes():
+            received += len(chunk)
+            tail = (tail + chunk)[-SUMMARY_TAIL_BYTES:]
+        status = response.status_code
+    # The pause summary is the last part of the multipart body (or the whole JSON body)
+    marker = b"Content-Type: application/json\r\n\r\n"
+    if marker in tail:
+        tail = tail.rsplit(marker, 1)[1].rsplit(b"\r\n--", 1)[0]
+    return status, received, json.loads(tail)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60])
+    parser.add_argument("--content-type", default="Paragraph")
+    parser.add_argument("--no-denoise", action="store_true", help="Only detect pauses")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    server = start_server(args.port)
+    results = []
+    try:
+        for minutes in args.minutes:
+            sampler = MemorySampler(server.pid)
+            sampler.start()
+            start = time.perf_counter()
+            status, received, summary = stream_clip(args.port, minutes * 60, args.content_type, not args.no_denoise)
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            results.append({
+                "minutes": minutes,
+                "status": status,
+                "upload_bytes": len(wav_header(0)) + int(minutes * 60 * SAMPLE_RATE) * 2,
+                "response_bytes": received,
+                "pause_count": summary.get("pause_count"),
+                "error": summary.get("error"),
+                "seconds": round(elapsed, 2),
+                "server_peak_rss_bytes": sampler.server_peak,
+                "ffmpeg_peak_rss_bytes": sampler.ffmpeg_peak,
+            })
+            print(json.dumps(results[-1]), file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {"metadata": run_metadata(), "results": results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from metrics import call_with_stage_labels, get_stage_labels, get_trace, mark_process_dead
+from tracing import call_traced
+
+logger = logging.getLogger(__name__)
+
+# Threads run the subprocess-bound audio path (ffmpeg waits outside the GIL),
+# processes run the CPU-bound text path (jiwer, fuzzy matching, IPA lookups).
+AUDIO_POOL_WORKERS = int(os.getenv("AUDIO_POOL_WORKERS", "8"))
+TEXT_POOL_WORKERS = int(os.getenv("TEXT_POOL_WORKERS", "2"))
+
+_thread_pool = None
+_process_pool = None
+
+
+def get_thread_pool():
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=AUDIO_POOL_WORKERS, thread_name_prefix="audio")
+    return _thread_pool
+
+
+def get_process_pool():
+    # Created lazily so every uvicorn worker gets its own pool after it starts
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=TEXT_POOL_WORKERS)
+    return _process_pool
+
+
+async def run_in_thread(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_thread_pool(), partial(context.run, func, *args, **kwargs))
+
+
+def discard_process_pool(pool):
+    # Shuts the pool down and drops the live gauges of its processes, which
+    # have exited or are being stopped
+    pids = list(pool._processes or {})
+    pool.shutdown(wait=False, cancel_futures=True)
+    for pid in pids:
+        mark_process_dead(pid)
+
+
+async def run_in_process(func, *args, **kwargs):
+    global _process_pool
+    loop = asyncio.get_running_loop()
+    trace = get_trace()
+    pool = get_process_pool()
+    try:
+        if trace is None:
+            return await loop.run_in_executor(pool, partial(call_with_stage_labels, get_stage_labels(), func, *args, **kwargs))
+        # The pool process sends its stage timings (and profile) back with the result
+        result, stages, stacks = await loop.run_in_executor(
+            pool, partial(call_traced, get_stage_labels(), trace.profile, func, *args, **kwargs)
+        )
+        trace.merge(stages, stacks)
+        return result
+    except BrokenProcessPool:
+        # A child died (e.g. OOM killed); replace the pool so later requests
+        # recover. Requests that were running on the same pool see the same
+        # error, and only the first one replaces it
+        if _process_pool is pool:
+            logger.error("Text process pool is broken, restarting it")
+            _process_pool = None
+            discard_process_pool(pool)
+        raise RuntimeError("Text processing worker terminated unexpectedly")
+
+
+def start_executors():
+    # Start every pool process up front so the first requests don't pay for it
+    pool = get_process_pool()
+    for future in [pool.submit(os.getpid) for _ in range(TEXT_POOL_WORKERS)]:
+        future.result()
+    get_thread_pool()
+
+
+def shutdown_executors():
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False)
+        _thread_pool = None
+    if _process_pool is not None:
+        # Wait so the pool processes get their stop signal before this
+        # worker exits; otherwise they are left behind as orphans
+        pids = list(_process_pool._processes or {})
+        _process_pool.shutdown(wait=True)
+        for pid in pids:
+            mark_process_dead(pid)
+        _process_pool = None
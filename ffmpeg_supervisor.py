@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import os
+import subprocess
+import time
+from contextlib import asynccontextmanager
+
+from metrics import get_stage_labels, get_trace, observe_stage, record_ffmpeg_job, record_ffmpeg_queue, record_ffmpeg_queue_wait, set_stage_labels, set_trace
+
+logger = logging.getLogger(__name__)
+
+# Host-wide limits, split evenly between the uvicorn workers (WORKERS)
+FFMPEG_MAX_PROCESSES = int(os.getenv("FFMPEG_MAX_PROCESSES", "0")) or os.cpu_count() or 1
+FFMPEG_MAX_QUEUE = int(os.getenv("FFMPEG_MAX_QUEUE", str(4 * FFMPEG_MAX_PROCESSES)))
+# How long a job may wait for a slot, and how long ffmpeg may then run
+FFMPEG_QUEUE_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_QUEUE_TIMEOUT_SECONDS", "10"))
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_SECONDS", "120"))
+
+
+class FFmpegBusyError(RuntimeError):
+    """
+    Raised instead of queueing when no ffmpeg slot is available: 429 when the
+    wait queue is full, 503 when a queued job waited too long for a slot.
+    """
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class FFmpegTimeoutError(RuntimeError):
+    pass
+
+
+class FFmpegResult:
+    def __init__(self, returncode, stdout, stderr):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class FFmpegSupervisor:
+    """
+    Runs every ffmpeg child of a worker as an asyncio subprocess, at most
+    `slots` at a time. Further jobs wait in a queue of at most `max_queue`
+    entries and are rejected right away once it is full; a job that waits
+    longer than queue_timeout or runs longer than timeout is abandoned (and
+    its process killed).
+
+    Coroutines call run(), or use process() to talk to a long-running
+    ffmpeg themselves; threads call run_blocking(), which hands the job
+    to the worker's event loop so both share the same limits. Outside a
+    running server (warm-up, scripts) run_blocking() runs ffmpeg directly
+    with the same timeout.
+    """
+
+    def __init__(self, max_processes=FFMPEG_MAX_PROCESSES, max_queue=FFMPEG_MAX_QUEUE,
+                 queue_timeout=FFMPEG_QUEUE_TIMEOUT_SECONDS, timeout=FFMPEG_TIMEOUT_SECONDS):
+        self.max_processes = max_processes
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.slots = 0
+        self.queue_size = 0
+        self.running = 0
+        self.waiting = 0
+        self._loop = None
+        self._semaphore = None
+
+    def start(self, loop=None):
+        # Called from each worker's startup, after the WORKERS count is known
+        workers = max(int(os.getenv("WORKERS", "1")), 1)
+        self.slots = max(self.max_processes // workers, 1)
+        self.queue_size = max(self.max_queue // workers, 0)
+        self._loop = loop or asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.slots)
+        self.running = 0
+        self.waiting = 0
+        self._record_queue()
+        logger.info(f"ffmpeg supervisor: {self.slots} slots, queue of {self.queue_size}")
+
+    def stop(self):
+        self._loop = None
+        self._semaphore = None
+
+    def stats(self):
+        return {"slots": self.slots, "running": self.running, "waiting": self.waiting, "queue_size": self.queue_size}
+
+    def _record_queue(self):
+        record_ffmpeg_queue(self.slots, self.running, self.waiting)
+
+    async def _acquire(self):
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending, so the next caller
+            # already sees it as taken
+            await self._semaphore.acquire()
+            record_ffmpeg_queue_wait(0.0)
+            return
+        if self.waiting >= self.queue_size:
+            record_ffmpeg_job("rejected")
+            raise FFmpegBusyError("Too many audio jobs queued, try again later", 429, self.queue_timeout)
+
+        self.waiting += 1
+        self._record_queue()
+        start = time.perf_counter()
+        try:
+            with observe_stage("ffmpeg_queue"):
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            record_ffmpeg_job("queue_timeout")
+            raise FFmpegBusyError(f"No ffmpeg slot became free within {self.queue_timeout:g}s", 503, self.queue_timeout)
+        finally:
+            self.waiting -= 1
+            self._record_queue()
+            record_ffmpeg_queue_wait(time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def process(self, args):
+        """
+        Holds a slot for the lifetime of the block and yields the ffmpeg
+        process started with piped stdin, stdout and stderr. The process is
+        killed if it is still running when the block exits.
+        """
+        if self._semaphore is None:
+            self.start()
+        semaphore = self._semaphore
+
+        await self._acquire()
+        self.running += 1
+        self._record_queue()
+        process = None
+        try:
+            with observe_stage("ffmpeg_spawn"):
+                process = await asyncio.create_subprocess_exec(
+                    *args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                )
+            yield process
+        finally:
+            # Timeouts and cancelled requests must not leave ffmpeg running
+            if process is not None and process.returncode is None:
+                process.kill()
+                await process.wait()
+            self.running -= 1
+            semaphore.release()
+            self._record_queue()
+
+    async def run(self, args, input=None, timeout=None):
+        """Runs the ffmpeg command line `args` with `input` on stdin; returns an FFmpegResult."""
+        timeout = timeout or self.timeout
+        async with self.process(args) as process:
+            try:
+                with observe_stage("ffmpeg_run"):
+                    stdout, stderr = await asyncio.wait_for(process.communicate(input), timeout)
+            except asyncio.TimeoutError:
+                record_ffmpeg_job("timeout")
+                raise FFmpegTimeoutError(f"ffmpeg did not finish within {timeout:g}s")
+            except BaseException:
+                record_ffmpeg_job("error")
+                raise
+
+        record_ffmpeg_job("ok" if process.returncode == 0 else "error")
+        return FFmpegResult(process.returncode, stdout, stderr)
+
+    async def _run_with_labels(self, labels, trace, args, input, timeout):
+        # Tasks created by run_coroutine_threadsafe start from the loop's
+        # context, so carry the caller's stage labels and trace over
+        set_stage_labels(**labels)
+        set_trace(trace)
+        return await self.run(args, input, timeout)
+
+    def run_blocking(self, args, input=None, timeout=None):
+        loop = self._loop
+        try:
+            asyncio.get_running_loop()
+            in_event_loop = True
+        except RuntimeError:
+            in_event_loop = False
+        # Blocking the loop's own thread on the loop would deadlock
+        if loop is not None and loop.is_running() and not in_event_loop:
+            future = asyncio.run_coroutine_threadsafe(self._run_with_labels(get_stage_labels(), get_trace(), args, input, timeout), loop)
+            return future.result()
+        return self._run_direct(args, input, timeout or self.timeout)
+
+    def _run_direct(self, args, input, timeout):
+        with observe_stage("ffmpeg_spawn"):
+            process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            with observe_stage("ffmpeg_run"):
+                stdout, stderr = process.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            record_ffmpeg_job("timeout")
+            raise FFmpegTimeoutError(f"ffmpeg did not finish within {timeout:g}s")
+        record_ffmpeg_job("ok" if process.returncode == 0 else "error")
+        return FFmpegResult(process.returncode, stdout, stderr)
+
+
+ffmpeg_supervisor = FFmpegSupervisor()
@@ -0,0 +1,213 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from sqlite_store import SQLiteConnections
+from utils import english_phoneme
+
+logger = logging.getLogger(__name__)
+
+LEARNER_PROFILE_PATH = os.getenv("LEARNER_PROFILE_PATH", "./cache/learner_profiles.sqlite3")
+# Pending updates are written at least this often, or sooner once this many
+# learners have some
+LEARNER_PROFILE_FLUSH_SECONDS = float(os.getenv("LEARNER_PROFILE_FLUSH_SECONDS", "1.0"))
+LEARNER_PROFILE_FLUSH_BATCH = int(os.getenv("LEARNER_PROFILE_FLUSH_BATCH", "500"))
+
+LEARNER_PROFILE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS learner_profiles ("
+    "learner_id TEXT PRIMARY KEY, evaluations INTEGER NOT NULL, counts BLOB NOT NULL, updated_at REAL NOT NULL)",
+)
+
+PHONEME_INDEX = {phoneme: i for i, phoneme in enumerate(english_phoneme)}
+
+# Rows of a profile's count matrix, one column per english_phoneme entry
+CONSTRUCT, MISSING, UNFAMILIAR = range(3)
+PROFILE_ROWS = 3
+COUNT_DTYPE = np.int32
+
+
+def empty_counts():
+    return np.zeros((PROFILE_ROWS, len(english_phoneme)), dtype=COUNT_DTYPE)
+
+
+def decode_counts(blob):
+    stored = np.frombuffer(blob, dtype=COUNT_DTYPE).reshape(PROFILE_ROWS, -1)
+    # Profiles written before english_phoneme grew keep their counts
+    counts = empty_counts()
+    counts[:, :stored.shape[1]] = stored
+    return counts
+
+
+def phoneme_indexes(phonemes):
+    return [PHONEME_INDEX[phoneme] for phoneme in set(phonemes) if phoneme in PHONEME_INDEX]
+
+
+def evaluation_counts(construct_phonemes, missing_phonemes):
+    """
+    Count matrix of one evaluation, from processLP's construct and missing
+    phoneme lists. Unfamiliar phonemes are the missing ones that were not
+    constructed anywhere else in the response, as in processLP.
+    """
+    counts = empty_counts()
+    construct = set(construct_phonemes)
+    counts[CONSTRUCT, phoneme_indexes(construct)] = 1
+    counts[MISSING, phoneme_indexes(missing_phonemes)] = 1
+    counts[UNFAMILIAR, phoneme_indexes(p for p in missing_phonemes if p not in construct)] = 1
+    return counts
+
+
+def weak_phonemes(counts, limit):
+    """
+    The `limit` phonemes the learner most often fails to produce: ranked by
+    the share of the evaluations containing the phoneme in which it was only
+    ever missing, then by how often that happened.
+    """
+    unfamiliar = counts[UNFAMILIAR]
+    seen = counts[CONSTRUCT] + unfamiliar
+    candidates = np.flatnonzero(unfamiliar)
+    scores = unfamiliar[candidates] / seen[candidates]
+    order = candidates[np.lexsort((-unfamiliar[candidates], -scores))][:limit]
+    return [
+        {
+            "phoneme": english_phoneme[i],
+            "score": float(unfamiliar[i] / seen[i]),
+            "unfamiliar_count": int(unfamiliar[i]),
+            "missing_count": int(counts[MISSING, i]),
+            "construct_count": int(counts[CONSTRUCT, i]),
+        }
+        for i in order
+    ]
+
+
+class LearnerProfileStore:
+    """
+    Per-learner phoneme count vectors, updated in O(1) per evaluation.
+
+    Updates are added to in-memory deltas and a background thread writes
+    them in batches: each flush adds the deltas to the stored vectors in one
+    SQLite transaction, so workers updating the same learner don't overwrite
+    each other. Reads combine the stored vector with this worker's pending
+    delta; other workers' updates show up once they have flushed.
+    """
+
+    def __init__(self, path=LEARNER_PROFILE_PATH, flush_seconds=LEARNER_PROFILE_FLUSH_SECONDS,
+                 flush_batch=LEARNER_PROFILE_FLUSH_BATCH):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.flush_batch = flush_batch
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._connections = SQLiteConnections(path, LEARNER_PROFILE_SCHEMA)
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+
+    def _connection(self):
+        return self._connections.get()
+
+    def start(self):
+        # Called from each worker's startup, so the thread exists after forking
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, name="learner-profiles", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def record(self, learner_id, construct_phonemes, missing_phonemes):
+        counts = evaluation_counts(construct_phonemes, missing_phonemes)
+        with self._lock:
+            pending = self._pending.get(learner_id)
+            if pending is None:
+                self._pending[learner_id] = [1, counts]
+            else:
+                pending[0] += 1
+                pending[1] += counts
+            if len(self._pending) >= self.flush_batch:
+                self._wake.set()
+
+    def get(self, learner_id):
+        """Returns (evaluations, count matrix), or None for an unknown learner."""
+        row = self._connection().execute(
+            "SELECT evaluations, counts FROM learner_profiles WHERE learner_id = ?", (learner_id,)
+        ).fetchone()
+        with self._lock:
+            pending = self._pending.get(learner_id)
+            if pending is not None:
+                pending = (pending[0], pending[1].copy())
+        if row is None and pending is None:
+            return None
+        evaluations, counts = (row[0], decode_counts(row[1])) if row is not None else (0, empty_counts())
+        if pending is not None:
+            evaluations += pending[0]
+            counts += pending[1]
+        return evaluations, counts
+
+    def weak_phonemes(self, learner_id, limit=10):
+        profile = self.get(learner_id)
+        if profile is None:
+            return None
+        evaluations, counts = profile
+        return evaluations, weak_phonemes(counts, limit)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                for learner_id, (evaluations, counts) in pending.items():
+                    row = conn.execute(
+                        "SELECT evaluations, counts FROM learner_profiles WHERE learner_id = ?", (learner_id,)
+                    ).fetchone()
+                    if row is not None:
+                        evaluations += row[0]
+                        counts = counts + decode_counts(row[1])
+                    conn.execute(
+                        "INSERT OR REPLACE INTO learner_profiles (learner_id, evaluations, counts, updated_at) VALUES (?, ?, ?, ?)",
+                        (learner_id, evaluations, counts.tobytes(), now),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            # Keep the deltas for the next attempt rather than losing them
+            logger.error(f"Error writing learner profiles: {str(e)}")
+            with self._lock:
+                for learner_id, (evaluations, counts) in pending.items():
+                    current = self._pending.get(learner_id)
+                    if current is None:
+                        self._pending[learner_id] = [evaluations, counts]
+                    else:
+                        current[0] += evaluations
+                        current[1] += counts
+            return 0
+        return len(pending)
+
+    def _flush_loop(self):
+        while self._running:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+
+learner_profiles = LearnerProfileStore()
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from os.path import join, dirname
+
+import eng_to_ipa
+from eng_to_ipa.transcribe import preserve_punc, cmu_to_ipa, _punct_replace_word, get_top
+
+# Bound on the memoized word -> IPA transcriptions
+WORD_CACHE_SIZE = int(os.getenv("PHONEME_CACHE_SIZE", "100000"))
+
+CMU_DICT_PATH = join(dirname(eng_to_ipa.__file__), "resources", "CMU_dict.db")
+
+
+class PhonemeLexicon:
+    """
+    In-memory replacement for eng_to_ipa.convert.
+
+    eng_to_ipa opens its SQLite dictionary and queries it on every call. This
+    loads the whole CMU table into a dict once and reuses eng_to_ipa's own
+    transcription helpers per word, so results are identical to
+    eng_to_ipa.convert with its default arguments.
+    """
+
+    def __init__(self, db_path=CMU_DICT_PATH, cache_size=WORD_CACHE_SIZE):
+        self.db_path = db_path
+        self._entries = None
+        self._lock = threading.Lock()
+        self.convert_word = lru_cache(maxsize=cache_size)(self._transcribe_word)
+
+    def load(self):
+        with self._lock:
+            if self._entries is not None:
+                return
+            entries = {}
+            conn = sqlite3.connect(self.db_path)
+            try:
+                for word, phonemes in conn.execute("SELECT word, phonemes FROM dictionary"):
+                    entries.setdefault(word, []).append(phonemes)
+            finally:
+                conn.close()
+            self._entries = {word: tuple(phonemes) for word, phonemes in entries.items()}
+
+    def _transcribe_word(self, word):
+        # Same steps eng_to_ipa.ipa_list takes for each whitespace-separated word
+        if self._entries is None:
+            self.load()
+        triple = preserve_punc(word.lower())[0]
+        cmu = self._entries.get(triple[1])
+        cmu = list(cmu) if cmu else ["__IGNORE__" + triple[1]]
+        ipa = cmu_to_ipa([cmu], stress_marking='both')
+        ipa = _punct_replace_word([triple], ipa)
+        return get_top(ipa)
+
+    def convert(self, text):
+        return ' '.join(self.convert_word(word) for word in text.split())
+
+    def convert_many(self, words):
+        return [self.convert(word) for word in words]
+
+    def __len__(self):
+        if self._entries is None:
+            self.load()
+        return len(self._entries)
+
+
+lexicon = PhonemeLexicon()
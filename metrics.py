@@ -0,0 +1,242 @@
+import contextvars
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Every uvicorn worker and pool process writes its samples under this
+# directory so /metrics can aggregate them. It has to be set before
+# prometheus_client is imported.
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "text-eval-metrics"))
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client import CONTENT_TYPE_LATEST
+
+LIVE_GAUGE_FILE_RE = re.compile(r"gauge_live\w+_(\d+)\.db$")
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_DURATION = Histogram(
+    "text_eval_stage_duration_seconds",
+    "Time spent in each processing stage.",
+    ["route", "language", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+PHONEME_CACHE = Gauge(
+    "text_eval_phoneme_cache",
+    "phoneme_ids LRU cache statistics (hits, misses, size).",
+    ["stat"],
+    multiprocess_mode="livesum",
+)
+PHONEME_ANOMALIES = Counter(
+    "text_eval_phoneme_anomalies_total",
+    "Characters the phoneme tokenizer could not map to an English phoneme.",
+    ["phoneme"],
+)
+
+RESULT_CACHE_REQUESTS = Counter(
+    "text_eval_result_cache_requests_total",
+    "Result cache lookups by namespace and outcome (hit or miss).",
+    ["namespace", "result"],
+)
+RESULT_CACHE_MEMORY = Gauge(
+    "text_eval_result_cache_memory",
+    "Per-worker result cache usage (bytes, entries), summed over workers.",
+    ["stat"],
+    multiprocess_mode="livesum",
+)
+
+AUDIO_CACHE_REQUESTS = Counter(
+    "text_eval_audio_cache_requests_total",
+    "Denoised audio cache lookups by outcome (hit or miss).",
+    ["result"],
+)
+
+FFMPEG_JOBS = Counter(
+    "text_eval_ffmpeg_jobs_total",
+    "ffmpeg jobs by outcome (ok, error, timeout, rejected, queue_timeout).",
+    ["outcome"],
+)
+FFMPEG_QUEUE = Gauge(
+    "text_eval_ffmpeg_queue",
+    "ffmpeg supervisor state (slots, running, waiting), summed over workers.",
+    ["stat"],
+    multiprocess_mode="livesum",
+)
+FFMPEG_QUEUE_WAIT = Histogram(
+    "text_eval_ffmpeg_queue_wait_seconds",
+    "Time ffmpeg jobs spent waiting for a free slot.",
+    buckets=STAGE_BUCKETS,
+)
+
+# Route and language of the request being processed, used as stage labels
+_stage_labels = contextvars.ContextVar("stage_labels", default={"route": "", "language": ""})
+
+# Stage timings of the request being handled, when it is traced
+_request_trace = contextvars.ContextVar("request_trace", default=None)
+
+# lru_cache-wrapped function whose cache_info() feeds PHONEME_CACHE
+_phoneme_cache = None
+
+
+class RequestTrace:
+    """
+    Durations of the stages one request went through, in the order they
+    finished, plus the profile samples taken for it when it is profiled.
+    """
+
+    def __init__(self, profile=False):
+        self.stages = []
+        self.profile = profile
+        self.stacks = {}
+        # (start, end) of the route endpoint, set by tracing.traced_endpoint
+        self.endpoint = None
+
+    def add(self, stage, seconds):
+        self.stages.append((stage, seconds))
+
+    def merge(self, stages, stacks=None):
+        self.stages.extend(stages)
+        for stack, count in (stacks or {}).items():
+            self.stacks[stack] = self.stacks.get(stack, 0) + count
+
+    def totals(self):
+        """Total seconds and count per stage, in order of first appearance."""
+        totals = {}
+        for stage, seconds in self.stages:
+            total, count = totals.get(stage, (0.0, 0))
+            totals[stage] = (total + seconds, count + 1)
+        return totals
+
+
+def start_trace(profile=False):
+    """Starts tracing the current context; returns the trace and a token for end_trace."""
+    trace = RequestTrace(profile)
+    return trace, _request_trace.set(trace)
+
+
+def end_trace(token):
+    _request_trace.reset(token)
+
+
+def get_trace():
+    return _request_trace.get()
+
+
+def set_trace(trace):
+    _request_trace.set(trace)
+
+
+def set_stage_labels(**labels):
+    _stage_labels.set({**_stage_labels.get(), **labels})
+
+
+def get_stage_labels():
+    return _stage_labels.get()
+
+
+def call_with_stage_labels(labels, func, *args, **kwargs):
+    # Entry point for pool processes, which do not inherit context variables
+    _stage_labels.set(labels)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        record_phoneme_cache_stats()
+
+
+@contextmanager
+def observe_stage(stage, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_labels = {**_stage_labels.get(), **labels}
+        STAGE_DURATION.labels(stage_labels["route"], stage_labels["language"], stage).observe(seconds)
+        trace = _request_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+
+def record_phoneme_anomaly(phoneme):
+    PHONEME_ANOMALIES.labels(phoneme).inc()
+
+
+def track_phoneme_cache(cached_func):
+    global _phoneme_cache
+    _phoneme_cache = cached_func
+    return cached_func
+
+
+def record_phoneme_cache_stats():
+    if _phoneme_cache is None:
+        return
+    info = _phoneme_cache.cache_info()
+    PHONEME_CACHE.labels("hits").set(info.hits)
+    PHONEME_CACHE.labels("misses").set(info.misses)
+    PHONEME_CACHE.labels("size").set(info.currsize)
+
+
+def record_result_cache(namespace, hit, size_bytes, entries):
+    RESULT_CACHE_REQUESTS.labels(namespace, "hit" if hit else "miss").inc()
+    RESULT_CACHE_MEMORY.labels("bytes").set(size_bytes)
+    RESULT_CACHE_MEMORY.labels("entries").set(entries)
+
+
+def record_audio_cache(hit):
+    AUDIO_CACHE_REQUESTS.labels("hit" if hit else "miss").inc()
+
+
+def record_ffmpeg_job(outcome):
+    FFMPEG_JOBS.labels(outcome).inc()
+
+
+def record_ffmpeg_queue_wait(seconds):
+    FFMPEG_QUEUE_WAIT.observe(seconds)
+
+
+def record_ffmpeg_queue(slots, running, waiting):
+    FFMPEG_QUEUE.labels("slots").set(slots)
+    FFMPEG_QUEUE.labels("running").set(running)
+    FFMPEG_QUEUE.labels("waiting").set(waiting)
+
+
+def clear_metrics_dir():
+    # Called once by the master process so counters start from zero
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(".db"):
+            os.remove(os.path.join(METRICS_DIR, name))
+
+
+def mark_process_dead(pid):
+    # Drops the livesum gauge files of a process that has exited, so its
+    # last values stop counting towards the totals
+    multiprocess.mark_process_dead(pid, METRICS_DIR)
+
+
+def mark_dead_processes():
+    """
+    mark_process_dead for every process with live gauge files that is no
+    longer running, such as the text pool processes of a worker that was
+    killed along with it.
+    """
+    for name in os.listdir(METRICS_DIR):
+        match = LIVE_GAUGE_FILE_RE.match(name)
+        if match is None:
+            continue
+        pid = int(match.group(1))
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            mark_process_dead(pid)
+        except PermissionError:
+            pass
+
+
+def render_metrics():
+    mark_dead_processes()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=METRICS_DIR)
+    return generate_latest(registry)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import os
+
+from sqlite_store import SQLiteConnections
+from utils import analyze_reference
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_REGISTRY_PATH = os.getenv("REFERENCE_REGISTRY_PATH", "./cache/references.sqlite3")
+# Optional JSONL file of {"text", "language", "content_id"?} records registered at startup
+REFERENCE_TEXTS_FILE = os.getenv("REFERENCE_TEXTS_FILE", "")
+
+REFERENCE_REGISTRY_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS reference_texts (content_id TEXT PRIMARY KEY, language TEXT NOT NULL, analysis TEXT NOT NULL)",
+)
+
+
+class ReferenceConflictError(ValueError):
+    pass
+
+
+def make_content_id(text, language):
+    return hashlib.sha256(f"{language}\n{text}".encode('utf-8')).hexdigest()[:24]
+
+
+class ReferenceRegistry:
+    """
+    Registered reference texts and their precomputed analysis
+    (utils.analyze_reference), keyed by content id.
+
+    Entries are kept in memory and persisted to SQLite, so a text registered
+    through one worker can be resolved by every other worker on the host.
+    A content id always refers to the text it was first registered with,
+    which keeps the in-memory copies in every worker valid.
+    """
+
+    def __init__(self, path=REFERENCE_REGISTRY_PATH):
+        self.path = path
+        self._entries = {}
+        self._connections = SQLiteConnections(path, REFERENCE_REGISTRY_SCHEMA)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def check(self, content_id, text, language):
+        """Raises ReferenceConflictError if content_id is registered for another text or language."""
+        existing = self.get(content_id)
+        if existing is not None and (existing["text"], existing["language"]) != (text, language):
+            raise ReferenceConflictError(f"Content id {content_id} is already registered for a different text.")
+
+    def add(self, content_id, analysis):
+        # Registering the same text again is a no-op
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO reference_texts (content_id, language, analysis) VALUES (?, ?, ?)",
+            (content_id, analysis["language"], json.dumps(analysis, ensure_ascii=False)),
+        )
+        if cursor.rowcount == 0:
+            self.check(content_id, analysis["text"], analysis["language"])
+            return
+        self._entries[content_id] = analysis
+
+    def register(self, text, language, content_id=None):
+        content_id = content_id or make_content_id(text, language)
+        self.check(content_id, text, language)
+        self.add(content_id, analyze_reference(text, language))
+        return content_id
+
+    def get(self, content_id):
+        analysis = self._entries.get(content_id)
+        if analysis is None:
+            row = self._connection().execute(
+                "SELECT analysis FROM reference_texts WHERE content_id = ?", (content_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            analysis = json.loads(row[0])
+            self._entries[content_id] = analysis
+        return analysis
+
+    def load_file(self, path):
+        """Registers every record of a JSONL file; returns the number registered."""
+        count = 0
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    self.register(record["text"], record["language"], record.get("content_id"))
+                    count += 1
+                except (ValueError, KeyError) as e:
+                    logger.error(f"Skipping reference text on line {line_number} of {path}: {str(e)}")
+        return count
+
+
+reference_registry = ReferenceRegistry()
+
+
+def load_reference_texts():
+    if REFERENCE_TEXTS_FILE:
+        count = reference_registry.load_file(REFERENCE_TEXTS_FILE)
+        logger.info(f"Registered {count} reference texts from {REFERENCE_TEXTS_FILE}")
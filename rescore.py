@@ -0,0 +1,298 @@
+"""
+Offline bulk rescoring: streams (reference, hypothesis, language) records
+from JSONL and CSV files through compute_text_matrices on a process pool and
+writes one JSON result per record, in input order.
+
+    python rescore.py answers.jsonl more.csv --output scores.jsonl --workers 8
+
+Records carry `reference` (or a registered `content_id`), `hypothesis`,
+`language` and an optional `id`. Each output line holds the record's `id`,
+`source` file and `line` number, plus `status_code` and either `result`
+(the /getTextMatrices response) or `error`.
+
+Progress is checkpointed next to the output (`<output>.checkpoint`), so an
+interrupted run started again with the same arguments picks up after the
+last record written. --restart discards the checkpoint and the output.
+"""
+import argparse
+import csv
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from itertools import islice
+
+# Keep this run's stage timings out of the metrics directory a server on the
+# same host aggregates; must happen before metrics is imported
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="rescore-metrics-")
+
+from lexicon import lexicon
+from reference_registry import reference_registry
+from utils import ALLOWED_LANGUAGES, compute_text_matrices
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 256
+# Chunks handed to the pool ahead of the one being written, per worker
+CHUNKS_IN_FLIGHT_PER_WORKER = 4
+
+
+class RecordError(ValueError):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def iter_records(paths):
+    """
+    Yields (source, line_number, record) for every record of the input files.
+    JSONL records are yielded as the raw line and parsed by the workers; CSV
+    rows are yielded as dicts.
+    """
+    for path in paths:
+        with open(path, encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                reader = csv.DictReader(f)
+                for row in reader:
+                    yield path, reader.line_num, row
+            else:
+                for line_number, line in enumerate(f, 1):
+                    if line.strip():
+                        yield path, line_number, line
+
+
+def resolve_record(record):
+    """Returns (reference, hypothesis, language, reference_analysis) like routes.resolve_text_data."""
+    language = record.get("language")
+    reference_analysis = None
+    if record.get("content_id"):
+        reference_analysis = reference_registry.get(record["content_id"])
+        if reference_analysis is None:
+            raise RecordError(f"Unknown content id: {record['content_id']}", 404)
+        if reference_analysis["language"] != language:
+            raise RecordError(f"Content id {record['content_id']} is registered for language {reference_analysis['language']}, not {language}.")
+        reference = reference_analysis["text"]
+    elif not record.get("reference"):
+        raise RecordError("Reference text must be provided.")
+    else:
+        reference = record["reference"]
+
+    hypothesis = record.get("hypothesis") or ""
+    if language not in ALLOWED_LANGUAGES:
+        raise RecordError(f"Unsupported language: {language}. Supported languages are: {', '.join(ALLOWED_LANGUAGES)}")
+
+    return reference, hypothesis, language, reference_analysis
+
+
+def score_record(source, line_number, record):
+    output = {"id": None, "source": source, "line": line_number, "status_code": 200, "result": None, "error": None}
+    try:
+        if isinstance(record, str):
+            try:
+                record = json.loads(record)
+            except ValueError as e:
+                raise RecordError(f"Invalid JSON: {str(e)}")
+            if not isinstance(record, dict):
+                raise RecordError("Record must be a JSON object.")
+        output["id"] = record.get("id")
+        reference, hypothesis, language, reference_analysis = resolve_record(record)
+        output["result"] = compute_text_matrices(reference, hypothesis, language, reference_analysis)
+    except RecordError as e:
+        output["status_code"] = e.status_code
+        output["error"] = str(e)
+    except Exception as e:
+        output["status_code"] = 500
+        output["error"] = str(e)
+    return output
+
+
+def score_chunk(chunk):
+    """Scores a list of records in a pool process; returns (JSONL text, error count)."""
+    lines = []
+    errors = 0
+    for source, line_number, record in chunk:
+        output = score_record(source, line_number, record)
+        if output["error"] is not None:
+            errors += 1
+        lines.append(json.dumps(output, ensure_ascii=False))
+    return "\n".join(lines) + "\n", errors
+
+
+def iter_chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Checkpoint:
+    """
+    Number of input records whose results are in the output, and the output
+    size at that point. Replaced atomically after every written chunk, so it
+    never claims more than the output holds.
+    """
+
+    def __init__(self, path, inputs):
+        self.path = path
+        self.inputs = inputs
+        self.records = 0
+        self.errors = 0
+        self.output_bytes = 0
+        self.complete = False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        if state["inputs"] != self.inputs:
+            raise ValueError(f"Checkpoint {self.path} was written for inputs {state['inputs']}; use --restart to start over.")
+        self.records = state["records"]
+        self.errors = state["errors"]
+        self.output_bytes = state["output_bytes"]
+        self.complete = state["complete"]
+        return True
+
+    def save(self):
+        state = {
+            "inputs": self.inputs,
+            "records": self.records,
+            "errors": self.errors,
+            "output_bytes": self.output_bytes,
+            "complete": self.complete,
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+
+class Progress:
+    def __init__(self, interval):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.records = 0
+        self._last_report = self.started
+
+    def add(self, count):
+        self.records += count
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            logger.info(f"{self.records} records, {self.rate():.1f} records/s")
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def rate(self):
+        elapsed = self.elapsed()
+        return self.records / elapsed if elapsed else 0.0
+
+
+def rescore(inputs, output_path, checkpoint_path, workers, chunk_size, report_interval=10.0, restart=False):
+    """Runs the rescoring job and returns its summary."""
+    inputs = [os.path.abspath(path) for path in inputs]
+    checkpoint = Checkpoint(checkpoint_path, inputs)
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    resumed = checkpoint.load()
+    if checkpoint.complete:
+        logger.info(f"{output_path} is already complete ({checkpoint.records} records)")
+        return {"records": 0, "total_records": checkpoint.records, "errors": checkpoint.errors, "seconds": 0.0, "records_per_second": 0.0, "workers": workers}
+    if resumed:
+        logger.info(f"Resuming after {checkpoint.records} records")
+
+    # Loaded once here and shared copy-on-write by the forked pool processes,
+    # as in prefork.serve
+    lexicon.load()
+    gc.collect()
+    gc.freeze()
+
+    output = open(output_path, "r+b" if resumed else "wb")
+    try:
+        # Drop anything written after the last checkpoint
+        output.truncate(checkpoint.output_bytes)
+        output.seek(checkpoint.output_bytes)
+
+        records = islice(iter_records(inputs), checkpoint.records, None)
+        chunks = iter_chunks(records, chunk_size)
+
+        progress = Progress(report_interval)
+        pending = deque()
+        max_pending = workers * CHUNKS_IN_FLIGHT_PER_WORKER
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            # Submit ahead only a bounded number of chunks so memory does not
+            # grow with the input, and write results back in input order
+            for chunk in chunks:
+                pending.append((len(chunk), pool.apply_async(score_chunk, (chunk,))))
+                if len(pending) >= max_pending:
+                    write_chunk(output, checkpoint, progress, *pending.popleft())
+            while pending:
+                write_chunk(output, checkpoint, progress, *pending.popleft())
+
+        checkpoint.complete = True
+        checkpoint.save()
+    finally:
+        output.close()
+
+    return {
+        "records": progress.records,
+        "total_records": checkpoint.records,
+        "errors": checkpoint.errors,
+        "seconds": round(progress.elapsed(), 3),
+        "records_per_second": round(progress.rate(), 1),
+        "workers": workers,
+    }
+
+
+def write_chunk(output, checkpoint, progress, count, async_result):
+    text, errors = async_result.get()
+    output.write(text.encode("utf-8"))
+    output.flush()
+    os.fsync(output.fileno())
+    checkpoint.records += count
+    checkpoint.errors += errors
+    checkpoint.output_bytes = output.tell()
+    checkpoint.save()
+    progress.add(count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="JSONL or CSV files (by extension)")
+    parser.add_argument("--output", required=True, help="JSONL file to write the results to")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Records per pool task and per checkpoint")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and rewrite the output")
+    args = parser.parse_args()
+
+    try:
+        summary = rescore(
+            args.inputs, args.output, args.checkpoint or f"{args.output}.checkpoint",
+            max(args.workers, 1), max(args.chunk_size, 1), args.report_interval, args.restart,
+        )
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+    finally:
+        shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
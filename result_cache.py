@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import record_result_cache
+from sqlite_store import SQLiteConnections, trim_lru
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# "memory" keeps results per worker; "sqlite" also shares them between workers
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_SQLITE_PATH = os.getenv("RESULT_CACHE_SQLITE_PATH", "./cache/results.sqlite3")
+RESULT_CACHE_SHARED_MAX_BYTES = int(os.getenv("RESULT_CACHE_SHARED_MAX_BYTES", str(512 * 1024 * 1024)))
+
+RESULT_CACHE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS results ("
+    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+    "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)",
+)
+
+
+def cache_key(namespace, *parts):
+    """
+    Content hash of a route's inputs. Texts are hashed as given: the error
+    arrays index into the raw reference and hypothesis, so even whitespace
+    changes can change the response.
+    """
+    payload = json.dumps([namespace, *parts], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """LRU with per-entry TTL, bounded by the JSON size of the stored values."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Shared tier for all workers on a host. Entries carry an expiry and a
+    last-access time; the oldest are trimmed once the table grows past
+    max_bytes.
+    """
+
+    TRIM_EVERY = 100
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._connections = SQLiteConnections(path, RESULT_CACHE_SCHEMA)
+        self._writes = 0
+
+    def _connection(self):
+        return self._connections.get()
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute("SELECT value FROM results WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, encoded, size):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, encoded, size, now + self.ttl, now),
+        )
+        self._writes += 1
+        if self._writes % self.TRIM_EVERY == 0:
+            self.trim()
+
+    def trim(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+        trim_lru(conn, "results", self.max_bytes)
+
+
+class ResultCache:
+    """
+    Two-tier cache for route responses: a per-worker memory LRU in front of
+    an optional shared SQLite backend. Hits and misses are exported through
+    /metrics per namespace.
+    """
+
+    def __init__(self, enabled=RESULT_CACHE_ENABLED, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL_SECONDS,
+                 backend=RESULT_CACHE_BACKEND, sqlite_path=RESULT_CACHE_SQLITE_PATH, shared_max_bytes=RESULT_CACHE_SHARED_MAX_BYTES):
+        self.enabled = enabled
+        self.memory = MemoryBackend(max_bytes, ttl)
+        self.shared = None
+        if enabled and backend == "sqlite":
+            self.shared = SQLiteBackend(sqlite_path, shared_max_bytes, ttl)
+        elif backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown result cache backend: {backend}")
+
+    def get(self, namespace, key):
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.memory.set(key, value, len(json.dumps(value, ensure_ascii=False)))
+        record_result_cache(namespace, value is not None, self.memory.size, len(self.memory))
+        return value
+
+    def set(self, namespace, key, value):
+        if not self.enabled:
+            return
+        encoded = json.dumps(value, ensure_ascii=False)
+        self.memory.set(key, value, len(encoded))
+        if self.shared is not None:
+            self.shared.set(key, encoded, len(encoded))
+
+
+result_cache = ResultCache()
@@ -1,19 +1,78 @@
+import asyncio
 import base64
-import io
+import json
 import logging
-from fastapi import APIRouter, HTTPException, Depends
+import mmap
+import os
+import uuid
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.formparsers import MultiPartParser
 from pydantic import BaseModel
-from utils import denoise_with_rnnoise, get_error_arrays, get_pause_count, split_into_phonemes, processLP
-from schemas import TextData, audioData, PhonemesRequest, PhonemesResponse, ErrorArraysResponse, AudioProcessingResponse
+from reference_registry import ReferenceConflictError, reference_registry, make_content_id
+from learner_profiles import learner_profiles
+from ffmpeg_supervisor import FFmpegBusyError, FFmpegTimeoutError
+from audio_stream import AudioStreamJob, StreamTooLargeError
+from audio_cache import audio_cache, audio_cache_key, iter_mapped
+from utils import ALLOWED_LANGUAGES, AUDIO_OUTPUT_FORMATS, UnsupportedAudioFormatError, audio_input_format, english_phoneme, analyze_reference, analyze_references, denoise_audio_async, denoise_and_detect_pauses_async, detect_pauses, PAUSE_DETECTOR_BACKEND, text_to_phonemes, compute_text_matrices, compute_text_matrices_batch, LiveTextMatrices, update_live_text_matrices
+from executors import run_in_process, run_in_thread
+from result_cache import cache_key, result_cache
+from warmup import readiness
+from tracing import TracedRoute
+from metrics import observe_stage, render_metrics, set_stage_labels, CONTENT_TYPE_LATEST
+from schemas import TextData, audioData, PhonemesRequest, PhonemesResponse, ErrorArraysResponse, AudioProcessingResponse, BatchErrorArraysItem, LivePartial, ReferenceRequest, ReferenceResponse, LearnerWeakPhonemesResponse
 from typing import List
-import jiwer
-import eng_to_ipa as p
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
+
+MAX_BATCH_SIZE = 500
+
+# Request body types accepted as raw audio by /audio_processing/binary
+# (the container itself is recognized from its leading bytes)
+RAW_AUDIO_TYPES = {
+    "audio/wav", "audio/x-wav", "audio/wave", "audio/ogg", "audio/opus", "audio/webm", "video/webm",
+    "audio/flac", "audio/x-flac", "audio/mpeg", "application/octet-stream",
+}
+MAX_AUDIO_UPLOAD_BYTES = int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+LIVE_MAX_PARTIALS = int(os.getenv("LIVE_MAX_PARTIALS", "2000"))
+LIVE_MAX_HYPOTHESIS_CHARS = int(os.getenv("LIVE_MAX_HYPOTHESIS_CHARS", "20000"))
+
+def resolve_text_data(data):
+    """
+    Validates a TextData item and returns (reference, hypothesis, language,
+    reference_analysis); the analysis is only set for registered references.
+    """
+    reference_analysis = None
+    if data.content_id:
+        reference_analysis = reference_registry.get(data.content_id)
+        if reference_analysis is None:
+            raise HTTPException(status_code=404, detail=f"Unknown content id: {data.content_id}")
+        if reference_analysis["language"] != data.language:
+            raise HTTPException(status_code=400, detail=f"Content id {data.content_id} is registered for language {reference_analysis['language']}, not {data.language}.")
+        reference = reference_analysis["text"]
+    elif not data.reference:
+        raise HTTPException(status_code=400, detail="Reference text must be provided.")
+    else:
+        reference = data.reference
+
+    hypothesis = data.hypothesis if data.hypothesis is not None else ""
+    language = data.language
+
+    # Validate language
+    if language not in ALLOWED_LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {language}. Supported languages are: {', '.join(ALLOWED_LANGUAGES)}")
+
+    return reference, hypothesis, language, reference_analysis
+
+def record_learner_evaluation(data, result):
+    # Only English evaluations produce construct/missing phonemes
+    if data.learner_id and data.language == "en":
+        learner_profiles.record(data.learner_id, result["confidence_char_list"], result["missing_char_list"])
 
 @router.post('/getTextMatrices', response_model=ErrorArraysResponse, summary="Compute Text Matrices", description="Computes WER, CER, insertion, deletion, substitution, confidence char list, missing char list, construct text", responses={
     400: {
@@ -52,69 +111,198 @@ router = APIRouter()
 async def compute_errors(data: TextData):
     try:
         # Validate input data
-        if not data.reference:
-            raise HTTPException(status_code=400, detail="Reference text must be provided.")
+        reference, hypothesis, language, reference_analysis = resolve_text_data(data)
 
-        reference = data.reference
-        hypothesis = data.hypothesis if data.hypothesis is not None else ""
-        language = data.language
+        set_stage_labels(route="/getTextMatrices", language=language)
 
-        # Validate language
-        allowed_languages = {"en", "ta", "te", "kn", "hi"}
-        if language not in allowed_languages:
-            raise HTTPException(status_code=400, detail=f"Unsupported language: {language}. Supported languages are: {', '.join(allowed_languages)}")
+        key = cache_key("getTextMatrices", reference, hypothesis, language)
+        cached = result_cache.get("getTextMatrices", key)
+        if cached is not None:
+            record_learner_evaluation(data, cached)
+            return cached
 
-        # Process character-level differences
         try:
-            charOut = jiwer.process_characters(reference, hypothesis)
-        except Exception as e:
-            logger.error(f"Error processing characters: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error processing characters: {str(e)}")
+            result = await run_in_process(compute_text_matrices, reference, hypothesis, language, reference_analysis)
+            result_cache.set("getTextMatrices", key, result)
+            record_learner_evaluation(data, result)
+            return result
+        except RuntimeError as e:
+            logger.error(str(e))
+            raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    
+@router.post('/getTextMatricesBatch', response_model=List[BatchErrorArraysItem], summary="Compute Text Matrices in Batch", description="Computes the /getTextMatrices output for a list of reference/hypothesis pairs in one call. Results are returned in input order; an item that fails carries its own error and status code instead of failing the batch.", responses={
+    400: {
+        "description": "Bad Request",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Batch must contain at least one item."}
+            }
+        }
+    },
+    422: {
+        "description": "Unprocessable Entity",
+        "content": {
+            "application/json": {
+                "example": {
+                    "detail": [
+                        {
+                            "loc": ["body", 0, "reference"],
+                            "msg": "field required",
+                            "type": "value_error.missing"
+                        }
+                    ]
+                }
+            }
+        }
+    },
+    500: {
+        "description": "Internal Server Error",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unexpected error: <error_message>"}
+            }
+        }
+    }
+})
+async def compute_errors_batch(data: List[TextData]):
+    try:
+        if not data:
+            raise HTTPException(status_code=400, detail="Batch must contain at least one item.")
+        if len(data) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"Batch size {len(data)} exceeds the maximum of {MAX_BATCH_SIZE} items.")
 
-        # Compute WER
-        try:
-            wer = jiwer.wer(reference, hypothesis)
-        except Exception as e:
-            logger.error(f"Error computing WER: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error computing WER: {str(e)}")
+        set_stage_labels(route="/getTextMatricesBatch")
 
-        confidence_char_list = []
-        missing_char_list = []
-        construct_text = ""
+        results = [None] * len(data)
+        valid_indexes = []
+        valid_items = []
 
-        if language == "en":
+        for i, item in enumerate(data):
             try:
-                confidence_char_list, missing_char_list, construct_text = processLP(reference, hypothesis)
-            except Exception as e:
-                logger.error(f"Error processing LP: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Error processing LP: {str(e)}")
+                reference, hypothesis, language, reference_analysis = resolve_text_data(item)
+            except HTTPException as e:
+                results[i] = {"status_code": e.status_code, "error": e.detail}
+                continue
+            key = cache_key("getTextMatrices", reference, hypothesis, language)
+            cached = result_cache.get("getTextMatrices", key)
+            if cached is not None:
+                record_learner_evaluation(item, cached)
+                results[i] = {"status_code": 200, "result": cached}
+                continue
+            valid_indexes.append(i)
+            valid_items.append((reference, hypothesis, language, reference_analysis))
 
-        # Extract error arrays
-        try:
-            error_arrays = get_error_arrays(charOut.alignments, reference, hypothesis)
-        except Exception as e:
-            logger.error(f"Error extracting error arrays: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error extracting error arrays: {str(e)}")
+        if valid_items:
+            batch_results = await run_in_process(compute_text_matrices_batch, valid_items)
+            for i, item, (result, error) in zip(valid_indexes, valid_items, batch_results):
+                if error is not None:
+                    logger.error(f"Batch item {i}: {error}")
+                    results[i] = {"status_code": 500, "error": error}
+                else:
+                    result_cache.set("getTextMatrices", cache_key("getTextMatrices", *item[:3]), result)
+                    record_learner_evaluation(data[i], result)
+                    results[i] = {"status_code": 200, "result": result}
 
-        return {
-            "wer": wer,
-            "cer": charOut.cer,
-            "insertion": error_arrays['insertion'],
-            "insertion_count": len(error_arrays['insertion']),
-            "deletion": error_arrays['deletion'],
-            "deletion_count": len(error_arrays['deletion']),
-            "substitution": error_arrays['substitution'],
-            "substitution_count": len(error_arrays['substitution']),
-            "confidence_char_list": confidence_char_list,
-            "missing_char_list": missing_char_list,
-            "construct_text": construct_text
-        }
+        return results
     except HTTPException as e:
         raise e
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-    
+
+async def receive_live_message(websocket):
+    # Text or binary frame holding one JSON object
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    return json.loads(message.get("text") or message.get("bytes") or "")
+
+def live_error(sequence, status_code, detail):
+    return {"sequence": sequence, "status_code": status_code, "result": None, "error": detail}
+
+@router.websocket('/live_evaluation')
+async def live_evaluation(websocket: WebSocket):
+    """
+    /getTextMatrices over streaming ASR partials. The first message is a
+    TextData object and every following one a LivePartial; the reference
+    and its word matching state are held for the whole session, so each
+    partial only scores the words that changed. The state is built and
+    updated in the text pool. Every partial is answered with
+    {"sequence", "status_code", "result", "error"}, result being the
+    /getTextMatrices output for the hypothesis so far.
+    """
+    await websocket.accept()
+    set_stage_labels(route="/live_evaluation")
+    sequence = 0
+    try:
+        try:
+            data = TextData.parse_obj(await receive_live_message(websocket))
+            reference, hypothesis, language, reference_analysis = resolve_text_data(data)
+            set_stage_labels(language=language)
+            live = await run_in_process(LiveTextMatrices, reference, language, reference_analysis)
+        except HTTPException as e:
+            await websocket.send_json(live_error(sequence, e.status_code, e.detail))
+            await websocket.close(code=1008)
+            return
+        except ValueError as e:
+            # Malformed JSON, a message that is not a TextData, or a blank reference
+            await websocket.send_json(live_error(sequence, 400, str(e)))
+            await websocket.close(code=1008)
+            return
+
+        # A hypothesis in the opening message is the first partial
+        partial = LivePartial(hypothesis=data.hypothesis) if data.hypothesis is not None else None
+        current = ""
+        while True:
+            sequence += 1
+            if sequence > LIVE_MAX_PARTIALS:
+                await websocket.send_json(live_error(sequence, 429, f"A session accepts at most {LIVE_MAX_PARTIALS} partials"))
+                await websocket.close(code=1008)
+                return
+            if partial is None:
+                try:
+                    partial = LivePartial.parse_obj(await receive_live_message(websocket))
+                except ValueError as e:
+                    await websocket.send_json(live_error(sequence, 400, str(e)))
+                    continue
+
+            candidate = partial.hypothesis if partial.hypothesis is not None else current + (partial.append or "")
+            final = partial.final
+            partial = None
+            if len(candidate) > LIVE_MAX_HYPOTHESIS_CHARS:
+                await websocket.send_json(live_error(sequence, 413, f"Hypothesis is longer than {LIVE_MAX_HYPOTHESIS_CHARS} characters"))
+                continue
+
+            try:
+                # The session goes to whichever pool process is free and
+                # comes back with its updated state
+                result, live = await run_in_process(update_live_text_matrices, live, candidate)
+            except RuntimeError as e:
+                logger.error(str(e))
+                await websocket.send_json(live_error(sequence, 500, str(e)))
+                continue
+            current = candidate
+
+            await websocket.send_json({"sequence": sequence, "status_code": 200, "result": result, "error": None})
+            if final:
+                record_learner_evaluation(data, result)
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        try:
+            await websocket.send_json(live_error(sequence, 500, f"Unexpected error: {str(e)}"))
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+
 @router.post("/getPhonemes", response_model=PhonemesResponse, summary="Get Phonemes", description="Converts text into phonemes.", responses={
     400: {
         "description": "Bad Request",
@@ -154,7 +342,12 @@ async def get_phonemes(data: PhonemesRequest):
         if not data.text.strip():
             raise HTTPException(status_code=400, detail="Input text cannot be empty.")
 
-        phonemesList = split_into_phonemes(p.convert(data.text))
+        set_stage_labels(route="/getPhonemes", language="en")
+        key = cache_key("getPhonemes", data.text)
+        phonemesList = result_cache.get("getPhonemes", key)
+        if phonemesList is None:
+            phonemesList = await run_in_process(text_to_phonemes, data.text)
+            result_cache.set("getPhonemes", key, phonemesList)
         return {"phonemes": phonemesList}
     except HTTPException as e:
         raise e
@@ -162,7 +355,105 @@ async def get_phonemes(data: PhonemesRequest):
         logger.error(f"Error getting phonemes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting phonemes: {str(e)}")
     
-@router.post('/audio_processing', response_model=AudioProcessingResponse, summary="Process Audio", description="Processes audio by denoising and detecting pauses.", responses={
+def ffmpeg_http_exception(e):
+    # Overload is reported with a retry hint; a job that ran too long is a gateway timeout
+    if isinstance(e, FFmpegBusyError):
+        logger.error(f"Audio job rejected: {str(e)}")
+        return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(max(int(e.retry_after), 1))})
+    logger.error(f"Audio job timed out: {str(e)}")
+    return HTTPException(status_code=504, detail=str(e))
+
+def validate_output_format(output_format):
+    if output_format not in AUDIO_OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format: {output_format}. Supported formats are: {', '.join(AUDIO_OUTPUT_FORMATS)}")
+    return AUDIO_OUTPUT_FORMATS[output_format]["media_type"]
+
+def sniff_input_format(audio_bytes):
+    try:
+        return audio_input_format(audio_bytes)
+    except UnsupportedAudioFormatError as e:
+        logger.error(f"Unsupported audio format: {str(e)}")
+        raise HTTPException(status_code=415, detail=str(e))
+
+async def detect_audio_pauses(audio_bytes, input_format):
+    try:
+        return await run_in_thread(detect_pauses, audio_bytes, None, input_format)
+    except (FFmpegBusyError, FFmpegTimeoutError) as e:
+        raise ffmpeg_http_exception(e)
+    except Exception as e:
+        logger.error(f"Error during pause count detection: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error during pause count detection: {str(e)}")
+
+async def run_audio_pipeline(audio_bytes, content_type, enable_pause_count, enable_denoiser, input_format, output_format):
+    pauses = []
+    denoised_audio = None
+
+    if enable_pause_count and enable_denoiser and (PAUSE_DETECTOR_BACKEND == 'ffmpeg' or input_format != 'wav'):
+        # Both outputs come from one ffmpeg run, so compressed audio is
+        # decoded only once
+        try:
+            denoised_audio, pauses = await denoise_and_detect_pauses_async(audio_bytes, content_type, input_format=input_format, output_format=output_format)
+        except (FFmpegBusyError, FFmpegTimeoutError) as e:
+            raise ffmpeg_http_exception(e)
+        except RuntimeError as e:
+            logger.error(f"Runtime error in denoise_and_detect_pauses: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Runtime error in denoise_and_detect_pauses: {str(e)}")
+        except Exception as e:
+            logger.error(f"Unexpected error in denoise_and_detect_pauses: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Unexpected error in denoise_and_detect_pauses: {str(e)}")
+        return denoised_audio, pauses
+
+    # In-process pause detection runs alongside the ffmpeg denoiser
+    pause_task = asyncio.ensure_future(detect_audio_pauses(audio_bytes, input_format)) if enable_pause_count else None
+
+    if enable_denoiser:
+        try:
+            denoised_audio = await denoise_audio_async(audio_bytes, content_type, input_format=input_format, output_format=output_format)
+        except (FFmpegBusyError, FFmpegTimeoutError) as e:
+            raise ffmpeg_http_exception(e)
+        except RuntimeError as e:
+            logger.error(f"Runtime error in denoise_with_rnnoise: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Runtime error in denoise_with_rnnoise: {str(e)}")
+        except Exception as e:
+            logger.error(f"Unexpected error in denoise_with_rnnoise: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Unexpected error in denoise_with_rnnoise: {str(e)}")
+        finally:
+            if pause_task is not None and not pause_task.done():
+                await asyncio.wait([pause_task])
+
+    if pause_task is not None:
+        pauses = await pause_task
+
+    return denoised_audio, pauses
+
+async def process_audio(audio_bytes, content_type, enable_pause_count, enable_denoiser, output_format='wav'):
+    """
+    Shared by the JSON and binary audio routes. Returns the denoised audio
+    encoded as output_format (None when the denoiser is disabled) and the
+    detected pauses. Denoised audio already in audio_cache is returned as a
+    read-only memory map of the cached file instead of running ffmpeg.
+    """
+    input_format = sniff_input_format(audio_bytes)
+    if not enable_denoiser or not audio_cache.enabled:
+        return await run_audio_pipeline(audio_bytes, content_type, enable_pause_count, enable_denoiser, input_format, output_format)
+
+    key = await run_in_thread(audio_cache_key, audio_bytes, content_type, output_format=output_format)
+    cached = await run_in_thread(audio_cache.get, key)
+    if cached is not None:
+        denoised_audio, pauses = cached
+        if not enable_pause_count:
+            return denoised_audio, []
+        if pauses is None:
+            # Stored by a request that did not ask for pauses
+            pauses = await detect_audio_pauses(audio_bytes, input_format)
+            await run_in_thread(audio_cache.set_pauses, key, pauses)
+        return denoised_audio, pauses
+
+    denoised_audio, pauses = await run_audio_pipeline(audio_bytes, content_type, enable_pause_count, enable_denoiser, input_format, output_format)
+    await run_in_thread(audio_cache.set, key, denoised_audio, pauses if enable_pause_count else None)
+    return denoised_audio, pauses
+
+@router.post('/audio_processing', response_model=AudioProcessingResponse, summary="Process Audio", description="Processes audio by denoising and detecting pauses. The audio may be WAV, Ogg (Opus or Vorbis), WebM, FLAC or MP3; the container is recognized from its leading bytes. The denoised audio is encoded as outputFormat.", responses={
     400: {
         "description": "Bad Request",
         "content": {
@@ -171,6 +462,14 @@ async def get_phonemes(data: PhonemesRequest):
             }
         }
     },
+    415: {
+        "description": "Unsupported Media Type",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unsupported audio format. Supported formats are: WAV, Ogg (Opus, Vorbis), WebM/Matroska, FLAC and MP3."}
+            }
+        }
+    },
     422: {
         "description": "Unprocessable Entity",
         "content": {
@@ -203,50 +502,436 @@ async def audio_processing(data: audioData):
             raise HTTPException(status_code=400, detail="Base64 string of audio must be provided.")
         if not data.contentType:
             raise HTTPException(status_code=400, detail="Content type must be specified.")
+        validate_output_format(data.outputFormat)
         
+        set_stage_labels(route="/audio_processing")
+
         try:
-            audio_data = data.base64_string
-            audio_bytes = base64.b64decode(audio_data)
-            audio_io = io.BytesIO(audio_bytes)
+            with observe_stage("base64_decode"):
+                audio_bytes = base64.b64decode(data.base64_string)
         except Exception as e:
             logger.error(f"Invalid base64 string: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Invalid base64 string: {str(e)}")
 
-        pause_count = 0
+        denoised_audio, pauses = await process_audio(audio_bytes, data.contentType, data.enablePauseCount, data.enableDenoiser, data.outputFormat)
+
         denoised_audio_base64 = ""
+        if denoised_audio is not None:
+            with observe_stage("base64_encode"):
+                denoised_audio_base64 = base64.b64encode(denoised_audio).decode('utf-8')
 
-        if data.enablePauseCount:
-            try:
-                pause_count = get_pause_count(audio_io)
-                if pause_count is None:
-                    logger.error("Error during pause count detection")
-                    raise HTTPException(status_code=500, detail="Error during pause count detection")
-            except Exception as e:
-                logger.error(f"Error during pause count detection: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Error during pause count detection: {str(e)}")
-
-        if data.enableDenoiser:
+        return {
+            "denoised_audio_base64": denoised_audio_base64,
+            "pause_count": len(pauses),
+            "pauses": pauses if data.enablePauseCount else None
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+def upload_too_large():
+    return HTTPException(status_code=413, detail=f"Audio exceeds the maximum upload size of {MAX_AUDIO_UPLOAD_BYTES} bytes.")
+
+async def limited_body(request, limit):
+    # Yields the body chunk by chunk so oversized uploads are rejected early,
+    # before a declared Content-Length is read at all
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise upload_too_large()
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise upload_too_large()
+        yield chunk
+
+async def read_audio_body(request):
+    body = bytearray()
+    async for chunk in limited_body(request, MAX_AUDIO_UPLOAD_BYTES):
+        body.extend(chunk)
+    return bytes(body)
+
+async def read_audio_form(request):
+    # The multipart framing and other fields get MULTIPART_OVERHEAD_BYTES on
+    # top of the audio limit; the audio part itself is checked once parsed
+    form = await MultiPartParser(request.headers, limited_body(request, MAX_AUDIO_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES)).parse()
+    try:
+        upload = form.get("audio")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart body must contain an 'audio' file part.")
+        audio_bytes = await upload.read()
+    finally:
+        await form.close()
+    if len(audio_bytes) > MAX_AUDIO_UPLOAD_BYTES:
+        raise upload_too_large()
+    return audio_bytes
+
+class UploadStreamingResponse(StreamingResponse):
+    # The upload is still being read while this response streams, so unlike
+    # StreamingResponse it must not consume receive() to watch for disconnects
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def multipart_response(parts):
+    # parts: list of (content_type, body bytes)
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for content_type, body in parts:
+        chunks.append(f"--{boundary}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode())
+        chunks.append(body)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode())
+    return Response(content=b"".join(chunks), media_type=f"multipart/mixed; boundary={boundary}")
+
+@router.post('/audio_processing/binary', summary="Process Audio (binary)", description="Binary variant of /audio_processing. The audio (WAV, Ogg, WebM, FLAC or MP3) is sent as a raw body or as the 'audio' part of a multipart/form-data body. When the denoiser is enabled the denoised audio is returned in outputFormat with the pause count in the X-Pause-Count header, or as a multipart/mixed body (audio part plus JSON part with pause_count and pauses) when the request accepts multipart/mixed. Without the denoiser the pause result is returned as JSON.", responses={
+    200: {
+        "description": "Denoised audio",
+        "content": {
+            "audio/wav": {},
+            "audio/ogg": {},
+            "audio/webm": {},
+            "multipart/mixed": {},
+            "application/json": {
+                "example": {"pause_count": 2, "pauses": [{"start": 1.2, "end": 2.0}, {"start": 2.3, "end": 3.0}]}
+            }
+        }
+    },
+    400: {
+        "description": "Bad Request",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Audio body must be provided."}
+            }
+        }
+    },
+    413: {
+        "description": "Payload Too Large",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Audio exceeds the maximum upload size of 52428800 bytes."}
+            }
+        }
+    },
+    415: {
+        "description": "Unsupported Media Type",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unsupported request content type: text/plain."}
+            }
+        }
+    },
+    500: {
+        "description": "Internal Server Error",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unexpected error: <error_message>"}
+            }
+        }
+    }
+})
+async def audio_processing_binary(
+    request: Request,
+    contentType: str = Query(..., example="Word", description="The type of content in the audio."),
+    enablePauseCount: bool = Query(..., example=True, description="Flag to enable pause count detection."),
+    enableDenoiser: bool = Query(..., example=True, description="Flag to enable audio denoising."),
+    outputFormat: str = Query("wav", example="ogg", description="Encoding of the denoised audio: wav (16-bit PCM), ogg or webm (Opus)."),
+):
+    try:
+        if not contentType:
+            raise HTTPException(status_code=400, detail="Content type must be specified.")
+        media_type = validate_output_format(outputFormat)
+
+        set_stage_labels(route="/audio_processing/binary")
+
+        request_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if request_type == "multipart/form-data":
+            audio_bytes = await read_audio_form(request)
+        elif request_type in RAW_AUDIO_TYPES:
+            audio_bytes = await read_audio_body(request)
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported request content type: {request_type or 'none'}.")
+
+        if not audio_bytes:
+            raise HTTPException(status_code=400, detail="Audio body must be provided.")
+
+        denoised_audio, pauses = await process_audio(audio_bytes, contentType, enablePauseCount, enableDenoiser, outputFormat)
+        pause_result = {"pause_count": len(pauses), "pauses": pauses if enablePauseCount else None}
+
+        if denoised_audio is None:
+            return JSONResponse(pause_result)
+
+        if "multipart/mixed" in request.headers.get("accept", ""):
+            return multipart_response([
+                (media_type, denoised_audio),
+                ("application/json", json.dumps(pause_result).encode()),
+            ])
+
+        headers = {"X-Pause-Count": str(len(pauses))} if enablePauseCount else {}
+        if isinstance(denoised_audio, mmap.mmap):
+            # Cache hit: sent from the mapped file in chunks rather than copied into one bytes object
+            headers["Content-Length"] = str(len(denoised_audio))
+            return StreamingResponse(iter_mapped(denoised_audio), media_type=media_type, headers=headers)
+        return Response(content=denoised_audio, media_type=media_type, headers=headers)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+@router.post('/audio_processing/stream', summary="Process Audio (streaming)", description="Streaming variant of /audio_processing/binary for long recordings. The raw audio body (WAV, Ogg, WebM, FLAC or MP3, recognized from its first bytes) is piped through ffmpeg while it is uploaded and pauses are detected as ffmpeg decodes it, so memory use does not grow with the clip length. With the denoiser enabled the response is a multipart/mixed body whose audio part (in outputFormat) streams out as it is produced, followed by a JSON part with pause_count and pauses (and error, if processing failed after the response had started). Without the denoiser the pause result is returned as JSON once the upload has been processed.", responses={
+    200: {
+        "description": "Denoised audio",
+        "content": {
+            "multipart/mixed": {},
+            "application/json": {
+                "example": {"pause_count": 2, "pauses": [{"start": 1.2, "end": 2.0}, {"start": 2.3, "end": 3.0}]}
+            }
+        }
+    },
+    413: {
+        "description": "Payload Too Large",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Audio exceeds the maximum stream size of 1073741824 bytes."}
+            }
+        }
+    },
+    415: {
+        "description": "Unsupported Media Type",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unsupported request content type: text/plain."}
+            }
+        }
+    },
+    429: {
+        "description": "Too Many Requests",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Too many audio jobs queued, try again later"}
+            }
+        }
+    },
+    500: {
+        "description": "Internal Server Error",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unexpected error: <error_message>"}
+            }
+        }
+    }
+})
+async def audio_processing_stream(
+    request: Request,
+    contentType: str = Query(..., example="Paragraph", description="The type of content in the audio."),
+    enablePauseCount: bool = Query(..., example=True, description="Flag to enable pause count detection."),
+    enableDenoiser: bool = Query(..., example=True, description="Flag to enable audio denoising."),
+    outputFormat: str = Query("wav", example="ogg", description="Encoding of the denoised audio: wav (16-bit PCM), ogg or webm (Opus)."),
+):
+    try:
+        if not contentType:
+            raise HTTPException(status_code=400, detail="Content type must be specified.")
+        validate_output_format(outputFormat)
+
+        set_stage_labels(route="/audio_processing/stream")
+
+        request_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if request_type not in RAW_AUDIO_TYPES:
+            raise HTTPException(status_code=415, detail=f"Unsupported request content type: {request_type or 'none'}.")
+
+        job = AudioStreamJob(request.stream(), contentType, enablePauseCount, enableDenoiser, outputFormat)
+        try:
             try:
-                denoised_audio_base64 = denoise_with_rnnoise(audio_data, data.contentType)
-                if denoised_audio_base64 is None:
-                    logger.error("Error during audio denoising")
-                    raise HTTPException(status_code=500, detail="Error during audio denoising")
-            except ValueError as e:
-                logger.error(f"Value error in denoise_with_rnnoise: {str(e)}")
-                raise HTTPException(status_code=400, detail=f"Value error in denoise_with_rnnoise: {str(e)}")
+                await job.start()
+                # Failures before any output (unreadable input, oversized
+                # body) still get a proper status code
+                await job.output_started()
+                if not enableDenoiser or job.done():
+                    result = await job.result()
+            except (FFmpegBusyError, FFmpegTimeoutError) as e:
+                raise ffmpeg_http_exception(e)
+            except StreamTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except UnsupportedAudioFormatError as e:
+                if job.received_bytes == 0:
+                    raise HTTPException(status_code=400, detail="Audio body must be provided.")
+                logger.error(f"Unsupported audio format: {str(e)}")
+                raise HTTPException(status_code=415, detail=str(e))
             except RuntimeError as e:
-                logger.error(f"Runtime error in denoise_with_rnnoise: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Runtime error in denoise_with_rnnoise: {str(e)}")
-            except Exception as e:
-                logger.error(f"Unexpected error in denoise_with_rnnoise: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Unexpected error in denoise_with_rnnoise: {str(e)}")
+                if job.received_bytes == 0:
+                    raise HTTPException(status_code=400, detail="Audio body must be provided.")
+                logger.error(f"Runtime error in streamed audio processing: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Runtime error in streamed audio processing: {str(e)}")
+        except Exception:
+            await job.close()
+            raise
 
-        return {
-            "denoised_audio_base64": denoised_audio_base64,
-            "pause_count": pause_count
+        if enableDenoiser:
+            boundary = uuid.uuid4().hex
+            return UploadStreamingResponse(job.multipart(boundary), media_type=f"multipart/mixed; boundary={boundary}")
+
+        await job.close()
+        return JSONResponse(result)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+def validate_reference_request(data):
+    if not data.text.strip():
+        raise HTTPException(status_code=400, detail="Reference text must be provided.")
+    if data.language not in ALLOWED_LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {data.language}. Supported languages are: {', '.join(ALLOWED_LANGUAGES)}")
+
+def reference_response(content_id, analysis):
+    return {"content_id": content_id, **{field: analysis[field] for field in ("language", "text", "words", "ipa", "phonemes")}}
+
+@router.post('/references', response_model=ReferenceResponse, summary="Register Reference Text", description="Registers a reference text and precomputes its tokenization, per-word IPA and phonemes. The returned content_id can be sent to /getTextMatrices and /getTextMatricesBatch instead of the reference text. A content_id keeps referring to the text it was first registered with; registering it again with a different text gets 409.", responses={
+    400: {
+        "description": "Bad Request",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Reference text must be provided."}
+            }
+        }
+    },
+    409: {
+        "description": "Conflict",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Content id story-12-line-3 is already registered for a different text."}
+            }
+        }
+    },
+    500: {
+        "description": "Internal Server Error",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unexpected error: <error_message>"}
+            }
+        }
+    }
+})
+async def register_reference(data: ReferenceRequest):
+    try:
+        validate_reference_request(data)
+        set_stage_labels(route="/references", language=data.language)
+
+        content_id = data.content_id or make_content_id(data.text, data.language)
+        reference_registry.check(content_id, data.text, data.language)
+        analysis = await run_in_process(analyze_reference, data.text, data.language)
+        reference_registry.add(content_id, analysis)
+        return reference_response(content_id, analysis)
+    except ReferenceConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+@router.post('/references/bulk', response_model=List[ReferenceResponse], summary="Register Reference Texts in Bulk", description="Registers a list of reference texts in one call and returns their content ids in input order.", responses={
+    400: {
+        "description": "Bad Request",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Item 3: Reference text must be provided."}
+            }
+        }
+    },
+    409: {
+        "description": "Conflict",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Item 3: Content id story-12-line-3 is already registered for a different text."}
+            }
+        }
+    },
+    500: {
+        "description": "Internal Server Error",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unexpected error: <error_message>"}
+            }
         }
+    }
+})
+async def register_references(data: List[ReferenceRequest]):
+    try:
+        for i, item in enumerate(data):
+            try:
+                validate_reference_request(item)
+            except HTTPException as e:
+                raise HTTPException(status_code=e.status_code, detail=f"Item {i}: {e.detail}")
+        set_stage_labels(route="/references/bulk")
+
+        content_ids = [item.content_id or make_content_id(item.text, item.language) for item in data]
+        for i, (item, content_id) in enumerate(zip(data, content_ids)):
+            try:
+                reference_registry.check(content_id, item.text, item.language)
+            except ReferenceConflictError as e:
+                raise HTTPException(status_code=409, detail=f"Item {i}: {str(e)}")
+
+        analyses = await run_in_process(analyze_references, [(item.text, item.language) for item in data])
+        response = []
+        for i, (content_id, analysis) in enumerate(zip(content_ids, analyses)):
+            try:
+                reference_registry.add(content_id, analysis)
+            except ReferenceConflictError as e:
+                raise HTTPException(status_code=409, detail=f"Item {i}: {str(e)}")
+            response.append(reference_response(content_id, analysis))
+        return response
     except HTTPException as e:
         raise e
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+@router.get('/references/{content_id}', response_model=ReferenceResponse, summary="Get Reference Text", description="Returns a registered reference text and its precomputed analysis.", responses={
+    404: {
+        "description": "Not Found",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unknown content id: 5d41402abc4b2a76b9719d91"}
+            }
+        }
+    }
+})
+def get_reference(content_id: str):
+    analysis = reference_registry.get(content_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail=f"Unknown content id: {content_id}")
+    return reference_response(content_id, analysis)
+
+@router.get('/learners/{learner_id}/weak_phonemes', response_model=LearnerWeakPhonemesResponse, summary="Get Weak Phonemes", description="Returns the phonemes a learner most often fails to produce, from the profile built up by /getTextMatrices and /getTextMatricesBatch calls that carried their learner_id. Answered from the learner's stored count vector, without replaying their history.", responses={
+    404: {
+        "description": "Not Found",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Unknown learner id: learner-42"}
+            }
+        }
+    }
+})
+def get_weak_phonemes(learner_id: str, limit: int = Query(10, ge=1, le=len(english_phoneme), description="Number of phonemes to return.")):
+    profile = learner_profiles.weak_phonemes(learner_id, limit)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown learner id: {learner_id}")
+    evaluations, weak = profile
+    return {"learner_id": learner_id, "evaluations": evaluations, "weak_phonemes": weak}
+
+@router.get('/metrics', summary="Metrics", description="Prometheus text-format metrics aggregated across all worker processes: per-stage latency histograms by route and language, phoneme cache statistics and phoneme anomaly counters.")
+def get_metrics():
+    return Response(content=render_metrics(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+@router.get('/health/ready', summary="Readiness", description="Returns 200 once this worker has finished its warm-up pass (lexicon loaded, text paths exercised, trial ffmpeg arnndn run) and 503 before that. Also reports startup time and this worker's memory use.")
+def health_ready():
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
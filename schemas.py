@@ -2,15 +2,18 @@ from pydantic import BaseModel,Field
 from typing import List, Optional, Dict 
 
 class TextData(BaseModel):
-    reference: str = Field(..., example="frog jumps", description="The reference text to compare against.")
+    reference: Optional[str] = Field(None, example="frog jumps", description="The reference text to compare against. Required unless content_id is given.")
+    content_id: Optional[str] = Field(None, example=None, description="Id of a reference text registered through /references, used instead of reference.")
     hypothesis: Optional[str] = Field(None, example="dog jumps", description="The hypothesis text to be compared.")
     language: str = Field(..., example="en", description="The language of the text.")
+    learner_id: Optional[str] = Field(None, example="learner-42", description="Id of the learner who read the text. For English, the evaluation's construct and missing phonemes are added to this learner's profile.")
 
 class audioData(BaseModel):
     base64_string: str = Field(..., example="UklGRiQAAABXQVZFZm10IBAAAAABAAEARKwAABCxAgAEABAAZGF0YUAA", description="Base64 encoded audio string.")
     enablePauseCount: bool = Field(..., example=True, description="Flag to enable pause count detection.")
     enableDenoiser: bool = Field(..., example=True, description="Flag to enable audio denoising.")
     contentType: str = Field(..., example="Word", description="The type of content in the audio.")
+    outputFormat: str = Field("wav", example="ogg", description="Encoding of the denoised audio: wav (16-bit PCM), ogg or webm (Opus).")
 
 class PhonemesRequest(BaseModel):
     text: str = Field(..., example="dog jumps", description="The text to convert into phonemes.")
@@ -32,6 +35,46 @@ class ErrorArraysResponse(BaseModel):
     missing_char_list: Optional[List[str]] = Field(None, example=["f", "g", "r", "ɑ"], description="List of missing characters.")
     construct_text: Optional[str] = Field(None, example="jumps", description="Constructed text based on the hypothesis.")
 
+class BatchErrorArraysItem(BaseModel):
+    status_code: int = Field(..., example=200, description="HTTP-style status of this item: 200 on success, 400 for invalid input, 500 for processing errors.")
+    result: Optional[ErrorArraysResponse] = Field(None, description="Text matrices for this item, set when status_code is 200.")
+    error: Optional[str] = Field(None, example=None, description="Error message for this item, set when status_code is not 200.")
+
+class LivePartial(BaseModel):
+    hypothesis: Optional[str] = Field(None, example="frog jum", description="The full hypothesis so far. Replaces the previous one, so partials may revise earlier words.")
+    append: Optional[str] = Field(None, example="ps", description="Text to add to the end of the previous hypothesis. Ignored when hypothesis is set.")
+    final: bool = Field(False, example=False, description="Marks the last partial: the session is recorded in the learner's profile and closed after its result.")
+
+class Pause(BaseModel):
+    start: float = Field(..., example=1.2, description="Start of the pause in seconds.")
+    end: Optional[float] = Field(None, example=2.0, description="End of the pause in seconds.")
+
 class AudioProcessingResponse(BaseModel):
     denoised_audio_base64: str = Field(..., example="UkiGRV////wqgwbwrbw////AAAA", description="Base64 encoded denoised audio.")
-    pause_count: Optional[int] = Field(..., example=2, description="Count of pauses detected.")
\ No newline at end of file
+    pause_count: Optional[int] = Field(..., example=2, description="Count of pauses detected.")
+    pauses: Optional[List[Pause]] = Field(None, example=[{"start": 1.2, "end": 2.0}, {"start": 2.3, "end": 3.0}], description="Start and end time of each detected pause.")
+
+class ReferenceRequest(BaseModel):
+    text: str = Field(..., example="frog jumps", description="The reference text to register.")
+    language: str = Field(..., example="en", description="The language of the text.")
+    content_id: Optional[str] = Field(None, example="story-12-line-3", description="Id to register the text under. Defaults to a hash of the language and text.")
+
+class ReferenceResponse(BaseModel):
+    content_id: str = Field(..., example="5d41402abc4b2a76b9719d91", description="Id to pass as content_id to the evaluation routes.")
+    language: str = Field(..., example="en", description="The language of the text.")
+    text: str = Field(..., example="frog jumps", description="The registered reference text.")
+    words: List[str] = Field(..., example=["frog", "jumps"], description="Lower-cased reference words.")
+    ipa: Optional[List[str]] = Field(None, example=["frɑg", "ʤəmps"], description="IPA transcription of each word (English only).")
+    phonemes: Optional[List[List[str]]] = Field(None, example=[["f", "r", "ɑ", "g"], ["ʤ", "ə", "m", "p", "s"]], description="Phonemes of each word (English only).")
+
+class WeakPhoneme(BaseModel):
+    phoneme: str = Field(..., example="θ", description="The phoneme.")
+    score: float = Field(..., example=0.75, description="Share of the learner's evaluations containing this phoneme in which it was only ever missing.")
+    unfamiliar_count: int = Field(..., example=3, description="Evaluations in which the phoneme was missing and not constructed.")
+    missing_count: int = Field(..., example=4, description="Evaluations in which the phoneme was missing.")
+    construct_count: int = Field(..., example=1, description="Evaluations in which the phoneme was constructed.")
+
+class LearnerWeakPhonemesResponse(BaseModel):
+    learner_id: str = Field(..., example="learner-42", description="Id of the learner.")
+    evaluations: int = Field(..., example=12, description="Number of English evaluations recorded for the learner.")
+    weak_phonemes: List[WeakPhoneme] = Field(..., description="Weakest phonemes first.")
@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteConnections:
+    """
+    One SQLite connection per thread and process for a database shared by
+    all workers on the host. The file, its directory and the schema are
+    created on first use rather than on import, so importing the app leaves
+    nothing behind.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+def trim_lru(conn, table, max_bytes):
+    """
+    Deletes the least recently used rows of table, which has key, size and
+    accessed_at columns, until their total size fits max_bytes again. Runs
+    in one transaction so concurrent trims from other workers don't
+    overshoot; returns the deleted keys.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+        keys = []
+        if total > max_bytes:
+            excess = total - max_bytes
+            removed = 0
+            for key, size in conn.execute(f"SELECT key, size FROM {table} ORDER BY accessed_at"):
+                keys.append(key)
+                removed += size
+                if removed >= excess:
+                    break
+            conn.executemany(f"DELETE FROM {table} WHERE key = ?", [(key,) for key in keys])
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return keys
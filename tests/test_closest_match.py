@@ -0,0 +1,63 @@
+"""
+The rapidfuzz similarity matrix behind identify_missing_tokens against the
+word-by-word fuzz.ratio loop of find_closest_match it replaced.
+"""
+import random
+
+import pytest
+
+from utils import SIMILARITY_PARALLEL_PAIRS, find_closest_match, find_closest_matches
+
+SEED = 0
+
+VOCABULARY = {
+    "en": "the a cat dog frog jumps runs over big small red sat on mat it is sun fun reading book apple quick brown fox lazy river garden teacher".split(),
+    "hi": "नमस्ते भारत बच्चे किताब पढ़ते हैं सूरज नदी बगीचा शिक्षक".split(),
+}
+
+
+def misspell(word, rng):
+    # Drop, double or swap a character, so scores spread over the whole range
+    if len(word) < 2:
+        return word + word
+    i = rng.randrange(len(word) - 1)
+    edit = rng.randrange(3)
+    if edit == 0:
+        return word[:i] + word[i + 1:]
+    if edit == 1:
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def passage(language, length, rng):
+    words = [rng.choice(VOCABULARY[language]) for _ in range(length)]
+    return [misspell(word, rng) if rng.random() < 0.3 else word for word in words]
+
+
+def loop_matches(reference, hypothesis):
+    hypothesis_text = ' '.join(hypothesis)
+    return [find_closest_match(word, hypothesis_text) for word in reference]
+
+
+@pytest.mark.parametrize("language", sorted(VOCABULARY))
+@pytest.mark.parametrize("sizes", [(1, 1), (5, 12), (40, 30), (12, 0), (0, 7)])
+def test_matrix_matches_fuzz_ratio_loop(language, sizes):
+    rng = random.Random(f"{SEED}-{language}-{sizes}")
+    for _ in range(20):
+        reference = passage(language, sizes[0], rng)
+        hypothesis = passage(language, sizes[1], rng)
+        assert find_closest_matches(reference, hypothesis) == loop_matches(reference, hypothesis)
+
+
+def test_matrix_matches_fuzz_ratio_loop_on_all_cores():
+    # Large enough for the parallel cdist path
+    rng = random.Random(SEED)
+    reference = passage("en", 150, rng)
+    hypothesis = passage("en", 150, rng)
+    assert len(reference) * len(hypothesis) >= SIMILARITY_PARALLEL_PAIRS
+    assert find_closest_matches(reference, hypothesis) == loop_matches(reference, hypothesis)
+
+
+def test_ties_keep_the_first_word():
+    assert find_closest_matches(["cat"], ["cut", "cot", "cat", "cat"]) == [("cat", 100)]
+    assert find_closest_matches(["cat"], ["bat", "hat"]) == loop_matches(["cat"], ["bat", "hat"]) == [("bat", 67)]
@@ -0,0 +1,34 @@
+"""
+LiveTextMatrices sessions moved between processes, as the text pool does
+with every /live_evaluation partial.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from utils import LiveTextMatrices, compute_text_matrices, phoneme_id, update_live_text_matrices
+
+
+def register_phonemes(phonemes):
+    return [phoneme_id(phoneme) for phoneme in phonemes]
+
+
+@pytest.mark.parametrize("method, word", [("spawn", "zxqvbø"), ("fork", "zxqvbñ")])
+def test_session_updated_in_another_process(method, word):
+    if method not in multiprocessing.get_all_start_methods():
+        pytest.skip(f"{method} start method is not available")
+    # The word is not in the lexicon, so its phonemes get anomaly ids
+    reference = f"the {word} jumps over the lazy dog"
+    partials = ["the", f"the {word}", f"the {word} jumps over", reference]
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(method)) as pool:
+        # The pool process hands out its next ids before this one does
+        pool.submit(register_phonemes, ["§", "¤", "¶"]).result()
+        live = LiveTextMatrices(reference, "en")
+        for hypothesis in partials:
+            result, live = pool.submit(update_live_text_matrices, live, hypothesis).result()
+            expected = compute_text_matrices(reference, hypothesis, "en")
+            expected.pop("pause_count", None)
+            assert result == expected
+            # And back in this process with the state the pool returned
+            assert live.update(hypothesis) == expected
@@ -0,0 +1,91 @@
+"""
+Parity of the in-process pause detector with ffmpeg's silencedetect, on
+synthetic WAV clips in the PCM formats clients send, mono and stereo.
+"""
+import asyncio
+import io
+import os
+import shutil
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from utils import denoise_and_detect_pauses_async, detect_pauses_ffmpeg, detect_pauses_numpy
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUBTYPES = ["PCM_U8", "PCM_16", "PCM_24", "PCM_32", "FLOAT"]
+SAMPLE_RATES = [8000, 16000, 44100]
+
+# ffmpeg logs silence_start with a few decimals
+START_TOLERANCE = 0.002
+
+
+def tone(seconds, sample_rate, db=-10.0, frequency=300.0):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return 10 ** (db / 20) * np.sin(2 * np.pi * frequency * t)
+
+
+def silence(seconds, sample_rate, db=None, seed=0):
+    # Digital silence, or noise peaking below db
+    n = int(seconds * sample_rate)
+    if db is None:
+        return np.zeros(n)
+    return np.random.RandomState(seed).uniform(-1, 1, n) * 10 ** (db / 20)
+
+
+def wav_bytes(channels, sample_rate, subtype):
+    buffer = io.BytesIO()
+    sf.write(buffer, np.stack(channels, axis=1), sample_rate, format="WAV", subtype=subtype)
+    return buffer.getvalue()
+
+
+def speech_like(sample_rate):
+    # Tone bursts around pauses longer and shorter than SILENCE_DURATION,
+    # one of them with a noise floor just under the -40 dB threshold
+    return np.concatenate([
+        tone(0.4, sample_rate),
+        silence(0.8, sample_rate),
+        tone(0.3, sample_rate),
+        silence(0.3, sample_rate),
+        tone(0.5, sample_rate),
+        silence(0.7, sample_rate, db=-46),
+        tone(0.2, sample_rate),
+    ])
+
+
+def clips():
+    for sample_rate in SAMPLE_RATES:
+        for subtype in SUBTYPES:
+            mono = speech_like(sample_rate)
+            yield f"mono-{sample_rate}-{subtype}", wav_bytes([mono], sample_rate, subtype)
+            yield f"stereo-{sample_rate}-{subtype}", wav_bytes([mono, mono], sample_rate, subtype)
+            # Tone on one channel only: a loud sample on any channel ends a pause
+            left = np.concatenate([silence(1.0, sample_rate), tone(1.0, sample_rate, db=-37), silence(1.0, sample_rate)])
+            yield f"one-channel-{sample_rate}-{subtype}", wav_bytes([left, np.zeros_like(left)], sample_rate, subtype)
+
+
+CLIPS = list(clips())
+
+
+def assert_same_pauses(expected, actual):
+    assert len(actual) == len(expected)
+    for pause, reference in zip(actual, expected):
+        assert pause["start"] == pytest.approx(reference["start"], abs=START_TOLERANCE)
+
+
+@pytest.mark.parametrize("audio", [audio for _, audio in CLIPS], ids=[name for name, _ in CLIPS])
+def test_numpy_detector_matches_ffmpeg(audio):
+    assert_same_pauses(detect_pauses_ffmpeg(audio), detect_pauses_numpy(audio))
+
+
+@pytest.mark.parametrize("audio", [audio for name, audio in CLIPS if name.endswith("44100-PCM_16")], ids=[name for name, _ in CLIPS if name.endswith("44100-PCM_16")])
+def test_combined_run_matches_numpy_detector(audio, monkeypatch):
+    # The single ffmpeg run behind the denoiser sees the same audio as the
+    # numpy detector; arnndn's model path is relative to the repository
+    monkeypatch.chdir(REPO_DIR)
+    _, pauses = asyncio.run(denoise_and_detect_pauses_async(audio, "Sentence"))
+    assert_same_pauses(pauses, detect_pauses_numpy(audio))
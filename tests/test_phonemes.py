@@ -0,0 +1,121 @@
+"""
+The in-memory lexicon against eng_to_ipa, and the compiled phoneme
+tokenizer and bitmask phoneme sets against the slicing
+split_into_phonemes they replaced.
+"""
+import random
+from collections import Counter
+
+import eng_to_ipa
+import pytest
+
+import utils
+from lexicon import lexicon
+from utils import english_phoneme, mask_to_phonemes, phoneme_ids, phoneme_mask, split_into_phonemes
+
+SEED = 0
+
+# Pieces of combined phonemes, stress marks, whitespace and characters
+# outside english_phoneme, so random strings hit every branch
+SYMBOLS = list("dʒtʃɪəʳʊeaoɔɑɜ:iubfgkl") + ["ʤ", "ʧ", "ˈ", "ˌ", "'", " ", "\t", " ", "ɚ", "x", "1", "-"]
+
+# Punctuation, contractions, unknown words and odd spacing
+TEXTS = [
+    "don't", "hello,", "xyzzy", "The Quick, brown-fox!", "  two  spaces ", "it's 4 o'clock.",
+    "\"quoted\" (words)", "ÉCOLE café", "",
+]
+
+
+def legacy_split_into_phonemes(token, anomalies):
+    # split_into_phonemes before the compiled tokenizer, without the cache
+    combined_phonemes = {
+        "dʒ": "ʤ",
+        "tʃ": "ʧ",
+        "ɪəʳ": "ɪəʳ",
+        "ʊəʳ": "ʊəʳ",
+        "eɪʳ": "eɪ",
+        "aɪ": "aɪ",
+        "oʊ": "o",
+        "ɔɪ": "ɔɪ",
+        "aʊ": "aʊ",
+        "eəʳ": "eəʳ",
+        "ɑ:": "ɑ",
+        "ɜ:ʳ": "ɜ:ʳ",
+        "ɔ:": "ɔ:",
+        "i:": "i",
+    }
+    skip_chars = {"'", " ", "ˈ", "ˌ"}
+    english_phoneme_set = set(english_phoneme)
+
+    ph_list = []
+    for p in token.split():
+        size = len(p)
+        i = 0
+        while i < size:
+            if p[i] in skip_chars:
+                i += 1
+                continue
+            if i + 3 <= size and p[i:i+3] in combined_phonemes:
+                ph_list.append(combined_phonemes[p[i:i+3]])
+                i += 3
+            elif i + 2 <= size and p[i:i+2] in combined_phonemes:
+                ph_list.append(combined_phonemes[p[i:i+2]])
+                i += 2
+            elif i + 1 <= size and p[i:i+1] in english_phoneme_set:
+                ph_list.append(p[i:i+1])
+                i += 1
+            else:
+                ph_list.append(p[i])
+                anomalies[p[i]] += 1
+                i += 1
+    return ph_list
+
+
+@pytest.fixture(scope="module")
+def dictionary_words():
+    lexicon.load()
+    return random.Random(SEED).sample(sorted(lexicon._entries), 2000)
+
+
+def random_ipa(count):
+    rng = random.Random(SEED)
+    return ["".join(rng.choice(SYMBOLS) for _ in range(rng.randint(0, 20))) for _ in range(count)]
+
+
+def test_lexicon_matches_eng_to_ipa(dictionary_words):
+    # eng_to_ipa looks a whole text up in one query, so one call covers the sample
+    text = " ".join(dictionary_words)
+    assert lexicon.convert(text).split() == eng_to_ipa.convert(text).split()
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_lexicon_matches_eng_to_ipa_on_punctuation(text):
+    assert lexicon.convert(text) == eng_to_ipa.convert(text)
+
+
+def test_tokenizer_matches_legacy_split(dictionary_words):
+    tokens = list(dict.fromkeys(lexicon.convert_many(dictionary_words) + random_ipa(2000)))
+    # Anomalies are counted on cache misses, once per token like the legacy code
+    phoneme_ids.cache_clear()
+    before = Counter(utils.anamoly_list)
+    legacy_anomalies = Counter()
+    for token in tokens:
+        assert split_into_phonemes(token) == legacy_split_into_phonemes(token, legacy_anomalies), token
+    assert Counter(utils.anamoly_list) - before == legacy_anomalies
+
+
+def test_phoneme_sets_match_legacy_sets(dictionary_words):
+    rng = random.Random(SEED)
+    ipa = lexicon.convert_many(dictionary_words)
+    for _ in range(200):
+        construct_ipa = rng.sample(ipa, 10)
+        missing_ipa = rng.sample(ipa, 10)
+        construct_mask = 0
+        missing_mask = 0
+        for token in construct_ipa:
+            construct_mask |= phoneme_mask(token)
+        for token in missing_ipa:
+            missing_mask |= phoneme_mask(token)
+        scratch = Counter()
+        assert set(mask_to_phonemes(construct_mask)) == {p for token in construct_ipa for p in legacy_split_into_phonemes(token, scratch)}
+        assert set(mask_to_phonemes(missing_mask)) == {p for token in missing_ipa for p in legacy_split_into_phonemes(token, scratch)}
@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+
+from metrics import call_with_stage_labels, end_trace, get_trace, start_trace
+
+logger = logging.getLogger(__name__)
+
+# Requests to profile: a random share of all requests, and/or those sent with
+# the X-Profile header. Profiles are written to PROFILE_DIR.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+PROFILE_HEADER = "x-profile"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+
+# Idle executor threads are left out of profiles
+_IDLE_FUNCTIONS = {("thread.py", "_worker")}
+
+_active_profiles = 0
+
+
+def frame_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler: a background thread records the stacks of
+    the given threads every `interval` seconds, as collapsed stacks
+    ("thread;file:function;... count") that flame graph tools read.
+    """
+
+    def __init__(self, thread_filter, interval=PROFILE_INTERVAL_SECONDS):
+        self.thread_filter = thread_filter
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._done.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or not self.thread_filter(thread_id, names.get(thread_id, "")):
+                    continue
+                stack = frame_stack(frame)
+                leaf = tuple(stack[-1].split(":", 1))
+                if leaf in _IDLE_FUNCTIONS:
+                    continue
+                key = ";".join([names.get(thread_id, str(thread_id))] + stack)
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+
+def call_traced(labels, profile, func, *args, **kwargs):
+    """
+    Entry point for pool processes when the calling request is traced.
+    Returns (result, stage timings, profile stacks) so the request's trace
+    also covers the work done here.
+    """
+    trace, token = start_trace()
+    profiler = None
+    if profile:
+        main_thread = threading.get_ident()
+        profiler = SamplingProfiler(lambda thread_id, name: thread_id == main_thread).start()
+    try:
+        result = call_with_stage_labels(labels, func, *args, **kwargs)
+    finally:
+        stacks = profiler.stop() if profiler is not None else None
+        end_trace(token)
+    if stacks:
+        stacks = {f"pool-process-{os.getpid()};{stack}": count for stack, count in stacks.items()}
+    return result, trace.stages, stacks
+
+
+def should_profile(request):
+    if PROFILE_HEADER_ENABLED and request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def handler_stages(trace, start, end):
+    # Splits the route handler's time around the endpoint call
+    if trace.endpoint is None:
+        return []
+    endpoint_start, endpoint_end = trace.endpoint
+    return [
+        ("request_parsing", endpoint_start - start),
+        ("endpoint", endpoint_end - endpoint_start),
+        ("serialization", end - endpoint_end),
+    ]
+
+
+def server_timing(trace, start, end):
+    entries = [
+        f"{stage};dur={seconds * 1000:.3f}" + (f';desc="x{count}"' if count > 1 else "")
+        for stage, (seconds, count) in trace.totals().items()
+    ]
+    entries.extend(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in handler_stages(trace, start, end))
+    entries.append(f"total;dur={(end - start) * 1000:.3f}")
+    return ", ".join(entries)
+
+
+def write_profile(trace, request, status_code, start, end, samples, interval):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.collapsed"), "w") as f:
+        for stack, count in sorted(trace.stacks.items()):
+            f.write(f"{stack} {count}\n")
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w") as f:
+        json.dump({
+            "method": request.method,
+            "path": request.url.path,
+            "status_code": status_code,
+            "total_seconds": end - start,
+            "interval_seconds": interval,
+            "samples": samples,
+            "stages": [{"stage": stage, "seconds": seconds} for stage, seconds in trace.stages + handler_stages(trace, start, end)],
+        }, f, indent=2)
+    return profile_id
+
+
+def traced_endpoint(endpoint):
+    """
+    Wraps a route endpoint to record its own duration, so the rest of the
+    handler time splits into request parsing and response serialization.
+    """
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            trace = get_trace()
+            start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if trace is not None:
+                    trace.endpoint = (start, time.perf_counter())
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            trace = get_trace()
+            start = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if trace is not None:
+                    trace.endpoint = (start, time.perf_counter())
+    return wrapper
+
+
+class TracedRoute(APIRoute):
+    """
+    Route class that traces every request: the stages observed while it is
+    handled (observe_stage, including those in pool processes) are returned
+    in a Server-Timing header along with request_parsing, endpoint,
+    serialization and total. Sampled requests are also profiled.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, traced_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            global _active_profiles
+            # One profile at a time per worker keeps the overhead bounded
+            profile = _active_profiles == 0 and should_profile(request)
+            trace, token = start_trace(profile)
+            profiler = None
+            if profile:
+                _active_profiles += 1
+                loop_thread = threading.get_ident()
+                profiler = SamplingProfiler(lambda thread_id, name: thread_id == loop_thread or name.startswith("audio")).start()
+            start = time.perf_counter()
+            try:
+                response = await handler(request)
+            except HTTPException as e:
+                # Error responses are built from the exception, so it carries the header
+                e.headers = {**(getattr(e, "headers", None) or {}), "Server-Timing": server_timing(trace, start, time.perf_counter())}
+                raise
+            finally:
+                end_trace(token)
+                if profiler is not None:
+                    trace.merge([], profiler.stop())
+                    _active_profiles -= 1
+
+            end = time.perf_counter()
+            response.headers["Server-Timing"] = server_timing(trace, start, end)
+            if profiler is not None:
+                try:
+                    profile_id = write_profile(trace, request, response.status_code, start, end, profiler.samples, profiler.interval)
+                    response.headers["X-Profile-Id"] = profile_id
+                except OSError as e:
+                    logger.error(f"Error writing profile: {str(e)}")
+            return response
+
+        return traced_handler
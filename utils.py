@@ -1,68 +1,199 @@
 import base64
 import io
+import logging
+import os
+import re
+import threading
 import ffmpeg
+import numpy as np
 from functools import lru_cache
-import eng_to_ipa as p
+from lexicon import lexicon, WORD_CACHE_SIZE
 from fuzzywuzzy import fuzz
+from rapidfuzz import process as rf_process
+from rapidfuzz.distance import Indel
 import soundfile as sf
+from alignment import character_errors, word_error_rate
+from ffmpeg_supervisor import ffmpeg_supervisor
+from metrics import observe_stage, record_phoneme_anomaly, track_phoneme_cache
+
+logger = logging.getLogger(__name__)
 
 english_phoneme = ["b","d","f","g","h","ʤ","k","l","m","n","p","r","s","t","v","w","z","ʒ","tʃ","ʃ","θ","ð","ŋ","j","æ","eɪ","ɛ","i:","ɪ","aɪ","ɒ","oʊ","ʊ","ʌ","u:","ɔɪ","aʊ","ə","eəʳ","ɑ:","ɜ:ʳ","ɔ:","ɪəʳ","ʊəʳ","i","u","ɔ","ɑ","ɜ","e","ʧ","o","y","a", "x", "c"]
 anamoly_list = {}
 
-def denoise_with_rnnoise(audio_base64, content_type, padding_duration=0.1, time_stretch_factor=0.75):
-    try:
-        # Decode base64 to get the audio data
-        try:
-            audio_data = base64.b64decode(audio_base64)
-        except base64.binascii.Error as e:
-            raise ValueError(f"Invalid base64 string: {str(e)}")
+ALLOWED_LANGUAGES = {"en", "ta", "te", "kn", "hi"}
 
-        audio_io = io.BytesIO(audio_data)
-        input_audio = audio_io.read()
+# Path to the RNNoise model
+RNNOISE_MODEL_PATH = "./audio_model/cb.rnnn"
 
-        # Path to the RNNoise model
-        model_path = "./audio_model/cb.rnnn"
+# Above this many reference x hypothesis word pairs the similarity matrix is
+# computed on all cores
+SIMILARITY_PARALLEL_PAIRS = 10000
 
-        # Create the ffmpeg filter chain
-        filter_chain = []
-        if content_type.lower() == 'word':
-            filter_chain.append(f'apad=pad_dur={padding_duration}')
-            filter_chain.append(f'apad=pad_dur={padding_duration}')
-        filter_chain.append(f'atempo={time_stretch_factor}')
-        filter_chain_str = ','.join(filter_chain)
+# silencedetect settings used for pause counting
+SILENCE_NOISE_DB = -40
+SILENCE_NOISE = f'{SILENCE_NOISE_DB}dB'
+SILENCE_DURATION = 0.5
 
-        # Apply the filters and denoise
-        try:
-            output, _ = (
-                ffmpeg
-                .input('pipe:', format='wav')
-                .output('pipe:', format='wav', af=f'{filter_chain_str},arnndn=m={model_path}')
-                .run(input=input_audio, capture_stdout=True, capture_stderr=True)
-            )
-        except ffmpeg.Error as e:
-            raise RuntimeError(f"Error during noise reduction with FFmpeg: {e.stderr.decode()}")
+# "numpy" detects pauses in-process, "ffmpeg" forks ffmpeg's silencedetect
+PAUSE_DETECTOR_BACKEND = os.getenv("PAUSE_DETECTOR_BACKEND", "numpy")
 
-        # Convert the processed output back to base64
-        try:
-            denoised_audio_base64 = base64.b64encode(output).decode('utf-8')
-        except Exception as e:
-            raise RuntimeError(f"Error encoding output to base64: {str(e)}")
-        
-        # Clear cache to free memory
-        del audio_data
-        del audio_io
-
-        return denoised_audio_base64
-
-    except ValueError as e:
-        print(f"Value error in denoise_with_rnnoise: {str(e)}")
-        raise
-    except RuntimeError as e:
-        print(f"Runtime error in denoise_with_rnnoise: {str(e)}")
-        raise
-    except Exception as e:
-        print(f"Unexpected error in denoise_with_rnnoise: {str(e)}")
-        raise
+# soundfile read dtype for each WAV subtype, matching the sample format
+# ffmpeg hands to silencedetect so amplitude thresholds truncate the same way
+SILENCE_SAMPLE_DTYPES = {
+    'PCM_U8': 'int16',
+    'PCM_S8': 'int16',
+    'PCM_16': 'int16',
+    'PCM_24': 'int32',
+    'PCM_32': 'int32',
+    'FLOAT': 'float32',
+    'DOUBLE': 'float64',
+}
+
+# Opus output is downmixed and resampled to this on the way out. Pauses are
+# detected on the decoded audio as is, and arnndn only runs at 48 kHz
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_CHANNEL_LAYOUT = 'mono'
+AUDIO_OPUS_BITRATE = os.getenv("AUDIO_OPUS_BITRATE", "24k")
+
+# Leading bytes of the accepted containers, checked in order, and the ffmpeg
+# demuxer for each; (offset, signature) pairs must all match
+AUDIO_SIGNATURES = [
+    ('wav', [(0, b'RIFF'), (8, b'WAVE')]),
+    ('ogg', [(0, b'OggS')]),
+    ('matroska', [(0, b'\x1a\x45\xdf\xa3')]),
+    ('flac', [(0, b'fLaC')]),
+    ('mp3', [(0, b'ID3')]),
+    ('mp3', [(0, b'\xff\xfb')]),
+    ('mp3', [(0, b'\xff\xf3')]),
+    ('mp3', [(0, b'\xff\xf2')]),
+]
+AUDIO_SIGNATURE_BYTES = 12
+
+# Selectable encodings of the denoised audio: muxer, codec options, whether
+# it is normalized to 16 kHz mono and the content type it is returned with.
+# wav keeps arnndn's 48 kHz output and the input's channels, as before
+AUDIO_OUTPUT_FORMATS = {
+    'wav': {'format': 'wav', 'codec': {'acodec': 'pcm_s16le'}, 'normalize': False, 'media_type': 'audio/wav'},
+    'ogg': {'format': 'ogg', 'codec': {'acodec': 'libopus', 'audio_bitrate': AUDIO_OPUS_BITRATE}, 'normalize': True, 'media_type': 'audio/ogg'},
+    'webm': {'format': 'webm', 'codec': {'acodec': 'libopus', 'audio_bitrate': AUDIO_OPUS_BITRATE}, 'normalize': True, 'media_type': 'audio/webm'},
+}
+
+class UnsupportedAudioFormatError(ValueError):
+    pass
+
+def sniff_audio_format(header):
+    """
+    Returns the ffmpeg demuxer for audio starting with `header` (at least
+    AUDIO_SIGNATURE_BYTES bytes where available), or None if no known
+    container matches.
+    """
+    for input_format, signature in AUDIO_SIGNATURES:
+        if all(header[offset:offset + len(magic)] == magic for offset, magic in signature):
+            return input_format
+    return None
+
+def audio_input_format(audio_data):
+    input_format = sniff_audio_format(audio_data[:AUDIO_SIGNATURE_BYTES])
+    if input_format is None:
+        raise UnsupportedAudioFormatError("Unsupported audio format. Supported formats are: WAV, Ogg (Opus, Vorbis), WebM/Matroska, FLAC and MP3.")
+    return input_format
+
+def audio_output_format(output_format):
+    if output_format not in AUDIO_OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}. Supported formats are: {', '.join(AUDIO_OUTPUT_FORMATS)}")
+    return AUDIO_OUTPUT_FORMATS[output_format]
+
+def decoded_input(input_format):
+    return ffmpeg.input('pipe:', format=input_format).audio
+
+def encoded_output(stream, output_format):
+    output = audio_output_format(output_format)
+    if output['normalize']:
+        # Downmixing and resampling happen in the one resampler ffmpeg
+        # inserts in front of aformat
+        stream = stream.filter('aformat', sample_rates=AUDIO_SAMPLE_RATE, channel_layouts=AUDIO_CHANNEL_LAYOUT)
+    return stream.output('pipe:', format=output['format'], **output['codec'])
+
+SILENCE_START_RE = re.compile(r'silence_start: (-?[0-9.]+)')
+SILENCE_END_RE = re.compile(r'silence_end: (-?[0-9.]+)')
+
+def apply_denoise_filters(stream, content_type, padding_duration=0.1, time_stretch_factor=0.75):
+    # Pad short word clips, slow the audio down, then run RNNoise
+    if content_type.lower() == 'word':
+        stream = stream.filter('apad', pad_dur=padding_duration)
+        stream = stream.filter('apad', pad_dur=padding_duration)
+    stream = stream.filter('atempo', time_stretch_factor)
+    return stream.filter('arnndn', m=RNNOISE_MODEL_PATH)
+
+def parse_silence_line(line, pauses):
+    # silencedetect logs one "silence_start" line per detected pause,
+    # followed by a "silence_end" line once the pause is over
+    start = SILENCE_START_RE.search(line)
+    if start:
+        pauses.append({"start": max(float(start.group(1)), 0.0), "end": None})
+        return
+    end = SILENCE_END_RE.search(line)
+    if end and pauses and pauses[-1]["end"] is None:
+        pauses[-1]["end"] = float(end.group(1))
+
+def parse_silence_timestamps(stderr):
+    pauses = []
+    for line in stderr.decode(errors='replace').split('\n'):
+        parse_silence_line(line, pauses)
+    return pauses
+
+def ffmpeg_output(result, check=True):
+    if check and result.returncode != 0:
+        raise ffmpeg.Error('ffmpeg', result.stdout, result.stderr)
+    return result.stdout, result.stderr
+
+def run_ffmpeg(stream, audio_data, check=True):
+    # Equivalent of stream.run(input=..., capture_stdout=True, capture_stderr=True),
+    # executed through the supervisor's concurrency limit and timeout. For
+    # threads and code outside the server; coroutines use run_ffmpeg_async
+    return ffmpeg_output(ffmpeg_supervisor.run_blocking(stream.compile(), audio_data), check)
+
+async def run_ffmpeg_async(stream, audio_data, check=True):
+    return ffmpeg_output(await ffmpeg_supervisor.run(stream.compile(), audio_data), check)
+
+def denoise_command(content_type, padding_duration=0.1, time_stretch_factor=0.75, input_format='wav', output_format='wav'):
+    stream = apply_denoise_filters(decoded_input(input_format), content_type, padding_duration, time_stretch_factor)
+    return encoded_output(stream, output_format)
+
+async def denoise_audio_async(audio_data, content_type, padding_duration=0.1, time_stretch_factor=0.75, input_format=None, output_format='wav'):
+    # Apply the filters and denoise; the input format is sniffed unless given
+    command = denoise_command(content_type, padding_duration, time_stretch_factor, input_format or audio_input_format(audio_data), output_format)
+    try:
+        output, _ = await run_ffmpeg_async(command, audio_data)
+    except ffmpeg.Error as e:
+        raise RuntimeError(f"Error during noise reduction with FFmpeg: {e.stderr.decode()}")
+    return output
+
+def denoise_and_detect_command(content_type, padding_duration=0.1, time_stretch_factor=0.75, input_format='wav', output_format='wav'):
+    """
+    Builds the single ffmpeg graph used for pause detection and denoising.
+
+    silencedetect passes the audio through unchanged, so it sits in front of
+    the denoise chain and sees the decoded input as is, at its own rate and
+    channel layout like detect_pauses_numpy. A linear chain
+    keeps ffmpeg's memory flat; an asplit into two outputs would buffer
+    whatever the slower branch has not consumed yet.
+    """
+    stream = decoded_input(input_format).filter('silencedetect', noise=SILENCE_NOISE, duration=SILENCE_DURATION)
+    return encoded_output(apply_denoise_filters(stream, content_type, padding_duration, time_stretch_factor), output_format)
+
+async def denoise_and_detect_pauses_async(audio_data, content_type, padding_duration=0.1, time_stretch_factor=0.75, input_format=None, output_format='wav'):
+    """
+    Runs pause detection and denoising in a single ffmpeg process.
+    Returns (denoised_audio_bytes, pauses).
+    """
+    command = denoise_and_detect_command(content_type, padding_duration, time_stretch_factor, input_format or audio_input_format(audio_data), output_format)
+    try:
+        output, stderr = await run_ffmpeg_async(command, audio_data)
+    except ffmpeg.Error as e:
+        raise RuntimeError(f"Error during audio processing with FFmpeg: {e.stderr.decode()}")
+    return output, parse_silence_timestamps(stderr)
 
 def convert_to_base64(audio_data, sample_rate):
     try:
@@ -113,21 +244,142 @@ def get_error_arrays(alignments, reference, hypothesis):
         'substitution': substitution, 
     }
 
+def build_text_matrices(reference, hypothesis, language, error_arrays, wer, cer, reference_analysis=None):
+    confidence_char_list = []
+    missing_char_list = []
+    construct_text = ""
+
+    if language == "en":
+        try:
+            with observe_stage("processLP", language=language):
+                confidence_char_list, missing_char_list, construct_text = processLP(reference, hypothesis, reference_analysis)
+        except Exception as e:
+            raise RuntimeError(f"Error processing LP: {str(e)}")
+
+    return text_matrices(error_arrays, wer, cer, confidence_char_list, missing_char_list, construct_text)
+
+def text_matrices(error_arrays, wer, cer, confidence_char_list, missing_char_list, construct_text):
+    return {
+        "wer": wer,
+        "cer": cer,
+        "insertion": error_arrays['insertion'],
+        "insertion_count": len(error_arrays['insertion']),
+        "deletion": error_arrays['deletion'],
+        "deletion_count": len(error_arrays['deletion']),
+        "substitution": error_arrays['substitution'],
+        "substitution_count": len(error_arrays['substitution']),
+        "confidence_char_list": confidence_char_list,
+        "missing_char_list": missing_char_list,
+        "construct_text": construct_text
+    }
+
+def compute_text_matrices(reference, hypothesis, language, reference_analysis=None):
+    wer, cer, error_arrays = align_text(reference, hypothesis, language)
+    return build_text_matrices(reference, hypothesis, language, error_arrays, wer, cer, reference_analysis)
+
+def align_text(reference, hypothesis, language):
+    # Align characters and extract the error arrays
+    try:
+        with observe_stage("char_alignment", language=language):
+            cer, error_arrays = character_errors(reference, hypothesis)
+    except Exception as e:
+        raise RuntimeError(f"Error processing characters: {str(e)}")
+
+    # Compute WER
+    try:
+        with observe_stage("wer", language=language):
+            wer = word_error_rate(reference, hypothesis)
+    except Exception as e:
+        raise RuntimeError(f"Error computing WER: {str(e)}")
+
+    return wer, cer, error_arrays
+
+def compute_text_matrices_batch(items):
+    """
+    Scores a list of (reference, hypothesis, language, reference_analysis)
+    tuples; reference_analysis may be None.
+
+    Returns a list of (result, error) pairs in input order; exactly one of the
+    two is set for each item.
+    """
+    results = []
+    for reference, hypothesis, language, reference_analysis in items:
+        try:
+            results.append((compute_text_matrices(reference, hypothesis, language, reference_analysis), None))
+        except RuntimeError as e:
+            results.append((None, str(e)))
+    return results
+
+def pause_detection_command(input_format='wav'):
+    return (
+        decoded_input(input_format)
+        .filter('silencedetect', noise=SILENCE_NOISE, duration=SILENCE_DURATION)
+        .output('pipe:', format='null')
+    )
+
+def detect_pauses_ffmpeg(audio_data, input_format=None):
+    # Run the FFmpeg command with the input from the byte stream
+    stdout, stderr = run_ffmpeg(pause_detection_command(input_format or audio_input_format(audio_data)), audio_data, check=False)
+    # Parse the stderr output for the silences
+    return parse_silence_timestamps(stderr)
+
+def detect_pauses_numpy(audio_data):
+    """
+    In-process equivalent of ffmpeg's silencedetect with the same noise and
+    duration settings.
+
+    Like silencedetect, each interleaved sample is compared against the
+    amplitude threshold and a pause is a run of silent samples lasting at
+    least SILENCE_DURATION; a loud sample on any channel ends the run.
+    """
+    info = sf.info(io.BytesIO(audio_data))
+    dtype = SILENCE_SAMPLE_DTYPES.get(info.subtype, 'float64')
+    samples, sample_rate = sf.read(io.BytesIO(audio_data), dtype=dtype, always_2d=True)
+    channels = samples.shape[1]
+
+    noise = 10 ** (SILENCE_NOISE_DB / 20)
+    if np.issubdtype(samples.dtype, np.integer):
+        threshold = int(noise * np.iinfo(samples.dtype).max)
+    else:
+        threshold = samples.dtype.type(noise)
+
+    interleaved = samples.ravel()
+    silent = (interleaved < threshold) & (interleaved > -threshold)
+
+    # Run boundaries of consecutive silent samples
+    edges = np.diff(silent.astype(np.int8), prepend=0, append=0)
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+
+    min_samples = int(round(SILENCE_DURATION * sample_rate)) * channels
+    pauses = (run_ends - run_starts) >= min_samples
+
+    return [
+        {"start": start / channels / sample_rate, "end": end / channels / sample_rate}
+        for start, end in zip(run_starts[pauses].tolist(), run_ends[pauses].tolist())
+    ]
+
+def detect_pauses(audio_data, backend=None, input_format=None):
+    """
+    Returns the pauses in the audio as a list of {"start", "end"} dicts in
+    seconds, using PAUSE_DETECTOR_BACKEND unless a backend is given.
+    Compressed audio always goes through ffmpeg, which decodes it anyway.
+    """
+    backend = backend or PAUSE_DETECTOR_BACKEND
+    input_format = input_format or audio_input_format(audio_data)
+    if backend == 'numpy' and input_format == 'wav':
+        try:
+            with observe_stage("pause_detection"):
+                return detect_pauses_numpy(audio_data)
+        except sf.LibsndfileError as e:
+            # Formats soundfile cannot decode still work through ffmpeg
+            logger.warning(f"Falling back to ffmpeg pause detection: {str(e)}")
+    elif backend not in ('numpy', 'ffmpeg'):
+        raise ValueError(f"Unknown pause detector backend: {backend}")
+    return detect_pauses_ffmpeg(audio_data, input_format)
+
 def get_pause_count(audio_io):
-        # Run the FFmpeg command with the input from the byte stream
-        process = (
-            ffmpeg
-            .input('pipe:0')
-            .filter('silencedetect', noise='-40dB', duration=0.5)
-            .output('pipe:1', format='null')
-            .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
-        )
-        # Write the audio data to the stdin of the FFmpeg process
-        stdout, stderr = process.communicate(input=audio_io.read())
-        # Parse the stderr output to count the silences
-        silence_lines = stderr.decode().split('\n')
-        silence_start_count = sum(1 for line in silence_lines if "silence_start" in line)
-        return silence_start_count
+    return len(detect_pauses(audio_io.read()))
 
 def find_closest_match(target_word, input_string):
     # Tokenize the input string into words
@@ -148,122 +400,332 @@ def find_closest_match(target_word, input_string):
     
     return best_match, best_score
 
-@lru_cache(maxsize=None)
+def find_closest_matches(target_words, words):
+    """
+    Vectorized find_closest_match: scores every target word against every
+    word in one rapidfuzz cdist call and returns a (best_match, best_score)
+    pair per target word.
+
+    Scores are fuzz.ratio's rounded Indel similarity, and argmax keeps the
+    first of equal scores, so results match the word-by-word loop.
+    """
+    if not words:
+        return [(None, 0) for _ in target_words]
+    if not target_words:
+        return []
+
+    workers = -1 if len(target_words) * len(words) >= SIMILARITY_PARALLEL_PAIRS else 1
+    similarity = rf_process.cdist(
+        target_words,
+        words,
+        scorer=Indel.normalized_similarity,
+        dtype=np.float64,
+        workers=workers,
+    )
+    scores = np.rint(100 * similarity).astype(np.int64)
+    return closest_matches_from_scores(words, scores)
+
+def closest_matches_from_scores(words, scores):
+    """find_closest_matches from an already computed score matrix (target words x words)."""
+    if not words:
+        return [(None, 0) for _ in range(len(scores))]
+    if not len(scores):
+        return []
+
+    best_indexes = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(scores)), best_indexes]
+
+    return [
+        (words[index], score) if score > 0 else (None, 0)
+        for index, score in zip(best_indexes.tolist(), best_scores.tolist())
+    ]
+
+# Phoneme mapping for combined phonemes
+COMBINED_PHONEMES = {
+    "dʒ": "ʤ",
+    "tʃ": "ʧ",
+    "ɪəʳ": "ɪəʳ",
+    "ʊəʳ": "ʊəʳ",
+    "eɪʳ": "eɪ",
+    "aɪ": "aɪ",
+    "oʊ": "o",
+    "ɔɪ": "ɔɪ",
+    "aʊ": "aʊ",
+    "eəʳ": "eəʳ",
+    "ɑ:": "ɑ",
+    "ɜ:ʳ": "ɜ:ʳ",
+    "ɔ:": "ɔ:",
+    "i:": "i",
+}
+
+# Set of characters to skip (stress marks, etc.), besides whitespace
+PHONEME_SKIP_CHARS = {"'", " ", "ˈ", "ˌ"}
+
+# Phoneme ids are positions in english_phoneme. Characters that are not
+# English phonemes get ids after those the first time this process sees
+# them, so ids are only meaningful within one process.
+PHONEME_NAMES = list(english_phoneme)
+PHONEME_IDS = {phoneme: i for i, phoneme in enumerate(PHONEME_NAMES)}
+_anomaly_lock = threading.Lock()
+
+# Each match skips stress marks and whitespace, then captures a combined
+# phoneme (longest first) or a single character: the same walk as checking
+# 3, 2 and then 1 character slices at each position of each word
+_skip_chars = "".join(re.escape(char) for char in sorted(PHONEME_SKIP_CHARS))
+PHONEME_TOKEN_RE = re.compile(
+    rf"[{_skip_chars}\s]*("
+    + "|".join(re.escape(key) for key in sorted(COMBINED_PHONEMES, key=len, reverse=True))
+    + rf"|[^{_skip_chars}\s])"
+)
+PHONEME_TOKEN_IDS = {
+    **{phoneme: i for phoneme, i in PHONEME_IDS.items() if len(phoneme) == 1},
+    **{key: PHONEME_IDS[phoneme] for key, phoneme in COMBINED_PHONEMES.items()},
+}
+
+def anomaly_phoneme_id(char):
+    # Log an anomaly if the character isn't recognized
+    with _anomaly_lock:
+        if char not in anamoly_list:
+            anamoly_list[char] = 1
+        else:
+            anamoly_list[char] += 1
+        index = PHONEME_IDS.get(char)
+        if index is None:
+            index = PHONEME_IDS[char] = len(PHONEME_NAMES)
+            PHONEME_NAMES.append(char)
+    record_phoneme_anomaly(char)
+    return index
+
+def phoneme_id(phoneme):
+    index = PHONEME_IDS.get(phoneme)
+    if index is None:
+        with _anomaly_lock:
+            index = PHONEME_IDS.setdefault(phoneme, len(PHONEME_NAMES))
+            if index == len(PHONEME_NAMES):
+                PHONEME_NAMES.append(phoneme)
+    return index
+
+@track_phoneme_cache
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def phoneme_ids(token):
+    """Tuple of phoneme ids of an IPA string."""
+    matches = PHONEME_TOKEN_RE.findall(token)
+    ids = list(map(PHONEME_TOKEN_IDS.get, matches))
+    if None in ids:
+        for i, index in enumerate(ids):
+            if index is None:
+                ids[i] = anomaly_phoneme_id(matches[i])
+    return tuple(ids)
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def phoneme_mask(token):
+    """Set of the phonemes of an IPA string, as a bitmask of phoneme ids."""
+    mask = 0
+    for index in phoneme_ids(token):
+        mask |= 1 << index
+    return mask
+
+def phonemes_mask(phonemes):
+    mask = 0
+    for phoneme in phonemes:
+        mask |= 1 << phoneme_id(phoneme)
+    return mask
+
+# Positions of the set bits of every byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+def mask_to_phonemes(mask):
+    """Phonemes of a bitmask, in phoneme id order."""
+    phonemes = []
+    offset = 0
+    while mask:
+        for bit in _BYTE_BITS[mask & 0xFF]:
+            phonemes.append(PHONEME_NAMES[offset + bit])
+        mask >>= 8
+        offset += 8
+    return phonemes
+
 def split_into_phonemes(token):
-    # Phoneme mapping for combined phonemes
-    combined_phonemes = {
-        "dʒ": "ʤ",
-        "tʃ": "ʧ",
-        "ɪəʳ": "ɪəʳ",
-        "ʊəʳ": "ʊəʳ",
-        "eɪʳ": "eɪ",
-        "aɪ": "aɪ",
-        "oʊ": "o",
-        "ɔɪ": "ɔɪ",
-        "aʊ": "aʊ",
-        "eəʳ": "eəʳ",
-        "ɑ:": "ɑ",
-        "ɜ:ʳ": "ɜ:ʳ",
-        "ɔ:": "ɔ:",
-        "i:": "i",
+    return [PHONEME_NAMES[index] for index in phoneme_ids(token)]
+
+def text_to_phonemes(text):
+    with observe_stage("phonemes"):
+        return split_into_phonemes(lexicon.convert(text))
+
+def analyze_reference(text, language):
+    """
+    Reference-side work of compute_text_matrices that only depends on the
+    reference text: word list and, for English, per-word IPA and
+    phonemes.
+    """
+    words = text.lower().split()
+    analysis = {
+        "text": text,
+        "language": language,
+        "words": words,
+        "ipa": None,
+        "phonemes": None,
     }
-    
-    # Set of characters to skip (stress marks, etc.)
-    skip_chars = {"'", " ", "ˈ", "ˌ"}
+    if language == "en":
+        analysis["ipa"] = lexicon.convert_many(words)
+        analysis["phonemes"] = [split_into_phonemes(ipa) for ipa in analysis["ipa"]]
+    return analysis
 
-    # Convert the english_phoneme list into a set for O(1) average-time complexity checks
-    english_phoneme_set = set(english_phoneme)
-    
-    ph_list = []
-    word_list = token.split()  # split by whitespace (space, tab, newline, etc.)
-
-    for p in word_list:
-        size = len(p)
-        i = 0
-        while i < size:
-            if p[i] in skip_chars:
-                i += 1
-                continue
-
-            # Check for combined phonemes first (3 then 2 characters long)
-            if i + 3 <= size and p[i:i+3] in combined_phonemes:
-                ph_list.append(combined_phonemes[p[i:i+3]])
-                i += 3
-            elif i + 2 <= size and p[i:i+2] in combined_phonemes:
-                ph_list.append(combined_phonemes[p[i:i+2]])
-                i += 2
-            elif i + 1 <= size and p[i:i+1] in english_phoneme_set:
-                ph_list.append(p[i:i+1])
-                i += 1
-            else:
-                # Log an anomaly if the character isn't recognized
-                ph_list.append(p[i])
-                if p[i] not in anamoly_list:
-                    anamoly_list[p[i]] = 1
-                else:
-                    anamoly_list[p[i]] += 1
-                i += 1
-
-    return ph_list
-
-def identify_missing_tokens(orig_text, resp_text):
-    # Splitting text into words
-    orig_word_list = orig_text.lower().split()
-    resp_word_list = resp_text.lower().split()
-    
-    # Initialize lists and dictionaries
-    construct_word_list = []
-    missing_word_list = []
-    orig_phoneme_list = []
-    construct_phoneme_list = []
-    missing_phoneme_list = []
+def analyze_references(items):
+    return [analyze_reference(text, language) for text, language in items]
+
+def reference_word_masks(orig_text, reference_analysis=None):
+    """Lowercased words of the reference and the phoneme bitmask of each."""
+    if reference_analysis is not None:
+        orig_word_list = reference_analysis["words"]
+        orig_word_masks = [phonemes_mask(p_word_phonemes) for p_word_phonemes in reference_analysis["phonemes"]]
+    else:
+        orig_word_list = orig_text.lower().split()
+        orig_word_masks = [phoneme_mask(p_word) for p_word in lexicon.convert_many(orig_word_list)]
+    return orig_word_list, orig_word_masks
+
+def categorize_words(orig_word_list, orig_word_masks, closest_matches, resp_phonemes):
+    """
+    Splits the original words into constructed (closest response word scores
+    above 80) and missing ones. Returns (construct phonemes, missing
+    phonemes, construct text) like identify_missing_tokens.
+    """
+    construct_mask = 0
+    missing_mask = 0
     construct_text = []
-    
-    # Precompute phonemes for response words for quick lookup
-    resp_phonemes = {word: p.convert(word) for word in resp_word_list}
-    print("resp_phoneme::", resp_phonemes)
-    for word in orig_word_list:
-        # Precompute original word phonemes
-        p_word = p.convert(word)
-        
-        # Find closest match based on precomputed phonemes to avoid redundant calculations
-        closest_match, similarity_score = find_closest_match(word, resp_text)
+
+    for word, p_word_mask, (closest_match, similarity_score) in zip(orig_word_list, orig_word_masks, closest_matches):
         
         # Check similarity and categorize word
         if similarity_score > 80:
-            construct_word_list.append(closest_match)
-            p_closest_match = resp_phonemes[closest_match]
-            construct_phoneme_list.append(split_into_phonemes(p_closest_match))
+            construct_mask |= phoneme_mask(resp_phonemes[closest_match])
             construct_text.append(closest_match)
         else:
-            missing_word_list.append(word)
-            p_word_phonemes = split_into_phonemes(p_word)
-            missing_phoneme_list.append(p_word_phonemes)
-        
-        # Store original phonemes for each word
-        orig_phoneme_list.append(split_into_phonemes(p_word))
+            missing_mask |= p_word_mask
 
     # Convert list of words to a single string
     construct_text = ' '.join(construct_text)
 
-    # Efficiently deduplicate and flatten phoneme lists
-    #orig_flatList = set(phoneme for sublist in orig_phoneme_list for phoneme in sublist)
-    missing_flatList = set(phoneme for sublist in missing_phoneme_list for phoneme in sublist)
-    construct_flatList = set(phoneme for sublist in construct_phoneme_list for phoneme in sublist)
+    return construct_mask, missing_mask, construct_text
+
+def identify_missing_tokens(orig_text, resp_text, reference_analysis=None):
+    """
+    Returns (construct phonemes, missing phonemes, construct text); the
+    phoneme sets are bitmasks of phoneme ids (see mask_to_phonemes).
+    """
+    # Splitting text into words
+    resp_word_list = resp_text.lower().split()
+    orig_word_list, orig_word_masks = reference_word_masks(orig_text, reference_analysis)
+    
+    # Precompute phonemes for response words for quick lookup
+    resp_phonemes = dict(zip(resp_word_list, lexicon.convert_many(resp_word_list)))
+
+    # Closest response word for every original word from one similarity matrix
+    with observe_stage("find_closest_match"):
+        closest_matches = find_closest_matches(orig_word_list, resp_word_list)
 
-    return list(construct_flatList), list(missing_flatList) ,construct_text
+    return categorize_words(orig_word_list, orig_word_masks, closest_matches, resp_phonemes)
 
-def processLP(orig_text, resp_text):
-    cons_list, miss_list, construct_text = identify_missing_tokens(orig_text, resp_text)
+def processLP(orig_text, resp_text, reference_analysis=None):
+    cons_mask, miss_mask, construct_text = identify_missing_tokens(orig_text, resp_text, reference_analysis)
 
     #remove phonemes from miss_list which are in cons_list, ?but add those phonemes a count of could be issue
 
     # phonemes in constructed list are familiar ones
     # phonemes that are in miss_list and not in cons_list are the unfamiliar ones
-    unfamiliar_list = []
-    for c in miss_list:
-        if c not in cons_list:
-            unfamiliar_list.append(c)
+    unfamiliar_mask = miss_mask & ~cons_mask
     #function to calculate wer cer, substitutions, deletions and insertions, silence, repetitions
-    #insert into DB the LearnerProfile vector
-    return cons_list, miss_list,construct_text
\ No newline at end of file
+    #the LearnerProfile vector is updated from these lists by learner_profiles.record
+    return mask_to_phonemes(cons_mask), mask_to_phonemes(miss_mask), construct_text
+
+
+class LiveTextMatrices:
+    """
+    build_text_matrices for a fixed reference and a hypothesis that grows as
+    streaming ASR partials arrive. The reference word masks and the
+    similarity scores of the reference words against each hypothesis word
+    are kept between updates, so an update only scores the hypothesis words
+    that changed.
+
+    The character and word alignments are redone on every update: rapidfuzz
+    strips the prefix the hypothesis shares with the reference before its
+    bit-parallel pass, which measured faster than carrying Levenshtein rows
+    from one partial to the next.
+    """
+
+    def __init__(self, reference, language, reference_analysis=None):
+        # Rejects the references character_errors would, before any partial
+        character_errors(reference, "")
+        self.reference = reference
+        self.language = language
+        self._resp_words = []
+        if language == "en":
+            self._orig_words, self._orig_masks = reference_word_masks(reference, reference_analysis)
+            # Scores are 0-100; uint8 keeps the session small to pickle
+            self._scores = np.zeros((len(self._orig_words), 64), dtype=np.uint8)
+
+    def __getstate__(self):
+        # Phoneme ids of anomaly characters are assigned per process, so the
+        # masks travel as phoneme names and are rebuilt by the receiver
+        state = self.__dict__.copy()
+        if "_orig_masks" in state:
+            state["_orig_masks"] = [mask_to_phonemes(mask) for mask in state["_orig_masks"]]
+        return state
+
+    def __setstate__(self, state):
+        if "_orig_masks" in state:
+            state["_orig_masks"] = [phonemes_mask(phonemes) for phonemes in state["_orig_masks"]]
+        self.__dict__.update(state)
+
+    def _closest_matches(self, resp_word_list):
+        kept = 0
+        for old_word, new_word in zip(self._resp_words, resp_word_list):
+            if old_word != new_word:
+                break
+            kept += 1
+        size = len(resp_word_list)
+        if size > self._scores.shape[1]:
+            scores = np.zeros((len(self._orig_words), max(size, 2 * self._scores.shape[1])), dtype=np.uint8)
+            scores[:, :kept] = self._scores[:, :kept]
+            self._scores = scores
+        if kept < size and self._orig_words:
+            similarity = rf_process.cdist(
+                self._orig_words,
+                resp_word_list[kept:],
+                scorer=Indel.normalized_similarity,
+                dtype=np.float64,
+            )
+            self._scores[:, kept:size] = np.rint(100 * similarity)
+        self._resp_words = resp_word_list
+        return closest_matches_from_scores(resp_word_list, self._scores[:, :size])
+
+    def update(self, hypothesis):
+        """Scores the full hypothesis so far; returns the same dict as compute_text_matrices."""
+        wer, cer, error_arrays = align_text(self.reference, hypothesis, self.language)
+
+        confidence_char_list = []
+        missing_char_list = []
+        construct_text = ""
+
+        if self.language == "en":
+            try:
+                with observe_stage("processLP", language=self.language):
+                    with observe_stage("find_closest_match"):
+                        closest_matches = self._closest_matches(hypothesis.lower().split())
+                    # Only the words that made it into construct_text need phonemes
+                    matched = {match for match, score in closest_matches if score > 80}
+                    resp_phonemes = dict(zip(matched, lexicon.convert_many(matched)))
+                    cons_mask, miss_mask, construct_text = categorize_words(
+                        self._orig_words, self._orig_masks, closest_matches, resp_phonemes
+                    )
+                    confidence_char_list = mask_to_phonemes(cons_mask)
+                    missing_char_list = mask_to_phonemes(miss_mask)
+            except Exception as e:
+                raise RuntimeError(f"Error processing LP: {str(e)}")
+
+        return text_matrices(error_arrays, wer, cer, confidence_char_list, missing_char_list, construct_text)
+
+def update_live_text_matrices(live, hypothesis):
+    # Text pool entry point: the session is pickled to the pool process and
+    # returned with its updated state, since any pool process may serve it
+    return live.update(hypothesis), live
@@ -0,0 +1,96 @@
+import io
+import logging
+import os
+import time
+
+import numpy as np
+import soundfile as sf
+
+from ffmpeg_supervisor import ffmpeg_supervisor
+from lexicon import lexicon
+from reference_registry import load_reference_texts
+from utils import compute_text_matrices, denoise_command, detect_pauses, run_ffmpeg, text_to_phonemes
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEXTS = [
+    ("the quick brown fox jumps over the lazy dog", "the quick brown fox jumped over a lazy dog", "en"),
+    ("नमस्ते भारत", "नमस्ते भारत", "hi"),
+]
+
+_state = {
+    "ready": False,
+    "error": None,
+    "started_at": time.perf_counter(),
+    "startup_seconds": None,
+}
+
+
+def make_warmup_wav(sample_rate=16000):
+    # Half a second of tone followed by a pause long enough to be detected
+    t = np.arange(sample_rate // 2) / sample_rate
+    samples = np.concatenate([0.3 * np.sin(2 * np.pi * 220 * t), np.zeros(int(0.6 * sample_rate))])
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+def warm_up():
+    """
+    Loads the lexicon and runs every processing path once, including a trial
+    ffmpeg arnndn run that validates the RNNoise model. Safe to call again;
+    it only does the work once per process tree.
+    """
+    if _state["ready"]:
+        return
+    try:
+        lexicon.load()
+        for reference, hypothesis, language in WARMUP_TEXTS:
+            compute_text_matrices(reference, hypothesis, language)
+        text_to_phonemes(WARMUP_TEXTS[0][0])
+        load_reference_texts()
+
+        audio = make_warmup_wav()
+        detect_pauses(audio)
+        denoised, _ = run_ffmpeg(denoise_command("Word"), audio)
+        if not denoised:
+            raise RuntimeError("Trial arnndn run produced no audio")
+    except Exception as e:
+        _state["error"] = str(e)
+        logger.error(f"Warm-up failed: {str(e)}")
+        raise
+
+    _state["ready"] = True
+    _state["error"] = None
+    _state["startup_seconds"] = time.perf_counter() - _state["started_at"]
+    logger.info(f"Warm-up finished in {_state['startup_seconds']:.2f}s")
+
+
+def is_ready():
+    return _state["ready"]
+
+
+def memory_usage():
+    """Resident and proportional set size of this process in bytes (PSS shows copy-on-write sharing)."""
+    usage = {"rss_bytes": None, "pss_bytes": None}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                if key in ("Rss", "Pss"):
+                    usage[f"{key.lower()}_bytes"] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+        usage["rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return usage
+
+
+def readiness():
+    return {
+        "status": "ready" if _state["ready"] else "starting",
+        "error": _state["error"],
+        "pid": os.getpid(),
+        "startup_seconds": _state["startup_seconds"],
+        "ffmpeg": ffmpeg_supervisor.stats(),
+        **memory_usage(),
+    }